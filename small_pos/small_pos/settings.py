@@ -74,10 +74,25 @@ WSGI_APPLICATION = 'small_pos.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# SQLite tuned for several tills and a manager on the reports at once: WAL so
+# readers and the writer no longer block each other, and a busy timeout so a
+# till waits for the write lock rather than failing (see user/sqlite/base.py)
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'user.sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file rather than memory, so threads in the tests get their own connections
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        'OPTIONS': {
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',  # safe with WAL, fsyncs at checkpoints only
+                'busy_timeout': 5000,  # ms
+                'mmap_size': 256 * 1024 * 1024,
+                'cache_size': -20000,  # KiB, so 20 MB per connection
+                'temp_store': 'MEMORY',
+            },
+        },
     }
 }
 
@@ -127,5 +142,13 @@ AUTH_USER_MODEL = 'user.User'  # Use custom user model
 
 LOGIN_URL = '/login/'
 
+# Draw the monthly sales chart on the reports page from the columnar sales
+# snapshot in ANALYTICS_DIR (see user/analytics.py) instead of the daily
+# rollup. Needs NumPy; ignored without it.
+REPORTS_USE_ANALYTICS = False
+ANALYTICS_DIR = BASE_DIR / 'analytics'
 
-
+# Activity log entries older than this many days are moved to compressed
+# monthly files in ACTIVITY_ARCHIVE_DIR by manage.py archive_activity_log
+ACTIVITY_LOG_RETENTION_DAYS = 90
+ACTIVITY_ARCHIVE_DIR = BASE_DIR / 'archive'
@@ -0,0 +1,260 @@
+"""Buffered activity log writer.
+
+``log`` builds the ``ActivityLog`` entry during the request and, once the
+surrounding transaction has committed, puts it on an in-process queue. A
+background thread writes queued entries with one ``bulk_create`` per batch
+of ``ACTIVITY_FLUSH_SIZE`` entries, or after ``ACTIVITY_FLUSH_INTERVAL``
+seconds, whichever comes first, so logging costs a request no query.
+Whatever is still queued is written when the process exits. If the queue
+is full (the database is stalled or the flusher has died) the entry is
+written straight away instead, so nothing is dropped. An entry the
+database refuses (its user was deleted before the flush) is logged and
+skipped; the rest of its batch is still written.
+
+Entries are timestamped when they are logged, not when they are written.
+Each batch also adds to ``ActivityDailyCount`` (entries per local day,
+action and user) in the same transaction, so the activity page's figures
+come from a few small rows; ``manage.py reconcile_activity_counts``
+checks them against the log.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from user import rollups
+from user.models import ActivityDailyCount, ActivityLog
+
+ACTIVITY_BUFFER_SIZE = 1000
+ACTIVITY_FLUSH_SIZE = 100
+ACTIVITY_FLUSH_INTERVAL = 1.0
+# How ``related_object`` names each model, e.g. "Product ID: 42"
+REFERENCE_LABELS = {'product': 'Product', 'category': 'Category', 'user': 'User', 'sales': 'Sale'}
+
+logger = logging.getLogger(__name__)
+
+_queue = queue.Queue(maxsize=ACTIVITY_BUFFER_SIZE)
+_STOP = object()
+_lock = threading.Lock()
+_flusher = None
+_stats = {'queued': 0, 'written': 0, 'overflowed': 0, 'failed': 0}
+_stats_lock = threading.Lock()
+
+
+def client_ip(request):
+    """Address the request came from, as seen by Django."""
+    return request.META.get('REMOTE_ADDR') or None
+
+
+def reference(obj):
+    """``(content type, id, label)`` of a model instance, or of a ``(model, pk)`` pair for deleted rows."""
+    model, pk = obj if isinstance(obj, tuple) else (type(obj), obj.pk)
+    label = REFERENCE_LABELS.get(model._meta.model_name, model.__name__)
+    return ContentType.objects.get_for_model(model), pk, f'{label} ID: {pk}'
+
+
+def log(request, action, description, obj=None, user=None):
+    """Record ``action`` on ``obj`` by ``user`` (the logged-in user by default) after the current transaction commits."""
+    if user is None and request is not None and request.user.is_authenticated:
+        user = request.user
+    content_type, object_id, related_object = reference(obj) if obj is not None else (None, None, '')
+    entry = ActivityLog(
+        user=user,
+        action=action,
+        description=description,
+        content_type=content_type,
+        object_id=object_id,
+        related_object=related_object,
+        ip_address=client_ip(request) if request is not None else None,
+        timestamp=timezone.now(),
+    )
+    transaction.on_commit(lambda: _enqueue(entry))
+    return entry
+
+
+def _bump(name, n=1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def _enqueue(entry):
+    _start()
+    try:
+        _queue.put_nowait(entry)
+        _bump('queued')
+    except queue.Full:
+        _bump('overflowed')
+        _write([entry])
+
+
+def _start():
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_run, name='activity-log', daemon=True)
+            _flusher.start()
+
+
+def _write(batch):
+    try:
+        _insert(batch)
+        return
+    except Exception:
+        if len(batch) == 1:
+            _bump('failed')
+            logger.exception('Could not write an activity log entry')
+            return
+    # One bad entry (say, for a user deleted since) fails the whole insert;
+    # write them one by one so only the bad ones are lost
+    for entry in batch:
+        _write([entry])
+
+
+def _insert(batch):
+    with transaction.atomic():
+        ActivityLog.objects.bulk_create(batch)
+        _count(batch)
+    _bump('written', len(batch))
+
+
+def _run():
+    while True:
+        entry = _queue.get()
+        if entry is _STOP:
+            return
+        batch = [entry]
+        deadline = time.monotonic() + ACTIVITY_FLUSH_INTERVAL
+        stopping = False
+        while len(batch) < ACTIVITY_FLUSH_SIZE:
+            try:
+                entry = _queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                stopping = True
+                break
+            batch.append(entry)
+        close_old_connections()
+        _write(batch)
+        if stopping:
+            return
+
+
+def _count(entries):
+    """Add ``entries`` to the per day, action and user counters."""
+    tz = timezone.get_current_timezone()
+    counts = Counter(
+        (entry.timestamp.astimezone(tz).date(), entry.action, entry.user_id) for entry in entries
+    )
+    for (day, action, user_id), count in counts.items():
+        rollups._upsert(ActivityDailyCount, {'day': day, 'action': action, 'user_id': user_id}, {'count': count})
+
+
+def activity_stats():
+    """Entry counts for the activity page, read from the daily counters.
+
+    Archived entries stay counted, so the total covers the whole history.
+    """
+    today = timezone.localdate()
+    week_ago = today - timedelta(days=7)
+    totals = ActivityDailyCount.objects.aggregate(
+        total=Sum('count'),
+        today=Sum('count', filter=Q(day=today)),
+        week=Sum('count', filter=Q(day__gte=week_ago)),
+    )
+    week = ActivityDailyCount.objects.filter(day__gte=week_ago)
+    labels = dict(ActivityLog.ACTION_CHOICES)
+    return {
+        'total_activities': totals['total'] or 0,
+        'today_activities': totals['today'] or 0,
+        'this_week_activities': totals['week'] or 0,
+        'week_by_action': [
+            {'action': row['action'], 'label': labels.get(row['action'], row['action']), 'count': row['total']}
+            for row in week.values('action').annotate(total=Sum('count')).order_by('-total')
+        ],
+        'week_by_user': [
+            {'user': row['user__username'] or 'System', 'count': row['total']}
+            for row in week.values('user__username').annotate(total=Sum('count')).order_by('-total')
+        ],
+    }
+
+
+def count_rows(start=None, end=None):
+    """``{(day, action, user_id): count}`` straight from the log, for the local days ``start`` to ``end``."""
+    entries = ActivityLog.objects.all()
+    if start:
+        entries = entries.filter(timestamp__gte=rollups.day_bounds(start, start)[0])
+    if end:
+        entries = entries.filter(timestamp__lt=rollups.day_bounds(end, end)[1])
+    rows = (
+        entries.annotate(day=TruncDate('timestamp'))
+        .values_list('day', 'action', 'user_id').annotate(total=Count('id')).order_by()
+    )
+    return {(day, action, user_id): total for day, action, user_id, total in rows}
+
+
+def counter_rows(start=None, end=None):
+    """``{(day, action, user_id): count}`` as the counters have it."""
+    counters = ActivityDailyCount.objects.filter(**rollups._day_filter(start, end))
+    rows = counters.values_list('day', 'action', 'user_id').annotate(total=Sum('count')).order_by()
+    return {(day, action, user_id): total for day, action, user_id, total in rows}
+
+
+def rebuild_counts(start=None, end=None):
+    """Recount the local days ``start`` to ``end`` from the log; returns the number of counter rows."""
+    actual = count_rows(start, end)
+    with transaction.atomic():
+        ActivityDailyCount.objects.filter(**rollups._day_filter(start, end)).delete()
+        ActivityDailyCount.objects.bulk_create([
+            ActivityDailyCount(day=day, action=action, user_id=user_id, count=count)
+            for (day, action, user_id), count in actual.items()
+        ], batch_size=500)
+    return len(actual)
+
+
+def flush():
+    """Write everything queued so far from the calling thread; returns the number of entries written."""
+    written = 0
+    while True:
+        batch = []
+        while len(batch) < ACTIVITY_FLUSH_SIZE:
+            try:
+                entry = _queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not _STOP:
+                batch.append(entry)
+        if not batch:
+            return written
+        _write(batch)
+        written += len(batch)
+
+
+@atexit.register
+def shutdown():
+    """Let the flusher finish its batch, then write whatever is left."""
+    if _flusher is not None and _flusher.is_alive():
+        try:
+            _queue.put(_STOP, timeout=ACTIVITY_FLUSH_INTERVAL)
+            _flusher.join(timeout=5)
+        except queue.Full:
+            pass
+    flush()
+
+
+def stats():
+    """Counters of this process's activity log writer."""
+    with _stats_lock:
+        counters = dict(_stats)
+    return {**counters, 'pending': _queue.qsize()}
@@ -0,0 +1,288 @@
+"""Columnar sales snapshots for multi-year trend analysis.
+
+Every completed sale is copied into a handful of NumPy columns (id, local
+time, cashier, payment method, total in pesewas, line and unit counts)
+saved as ``.npy`` files under ``ANALYTICS_DIR``. ``refresh`` only reads
+sales past the stored ``sales_id`` high-water mark and writes them as a new
+segment; segments are memory-mapped when loaded and merged once there are
+more than ``MAX_SEGMENTS``. Aggregates are computed with vectorised
+group-bys (``bincount``) over the whole history at once.
+
+SQLite serialises writers and sale ids are handed out inside the writing
+transaction, so sales become visible in id order and the high-water mark
+never skips one. Sales edited after they were snapshotted are not picked
+up; run ``manage.py refresh_sales_snapshot --rebuild`` after such edits.
+
+NumPy is optional: ``available()`` is False without it and the reports
+fall back to the database.
+"""
+import json
+import os
+import shutil
+import threading
+from datetime import date, datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from user.models import Sales, SaleItem
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+COLUMNS = {
+    'sales_id': 'int64',
+    'local_ts': 'int64',
+    'cashier_id': 'int64',
+    'payment': 'int8',
+    'total_cents': 'int64',
+    'lines': 'int32',
+    'units': 'int32',
+}
+PAYMENT_CODES = [code for code, _ in Sales.PAYMENT_CHOICES]
+REFRESH_CHUNK = 50_000
+MAX_SEGMENTS = 16
+EPOCH = date(1970, 1, 1)
+LOCAL_EPOCH = datetime(1970, 1, 1)
+
+_lock = threading.Lock()
+_loaded = None
+
+
+def available():
+    return np is not None
+
+
+def snapshot_dir():
+    return Path(getattr(settings, 'ANALYTICS_DIR', settings.BASE_DIR / 'analytics'))
+
+
+class SalesSnapshot:
+    """Columns of every snapshotted sale, with vectorised aggregates over them."""
+
+    def __init__(self, columns, high_water, segments=()):
+        self.columns = columns
+        self.high_water = high_water
+        self.segments = tuple(segments)
+
+    def __len__(self):
+        return len(self.columns['sales_id'])
+
+    def days(self):
+        """Local day of each sale, as days since 1970-01-01."""
+        return self.columns['local_ts'] // 86400
+
+    def mask(self, start=None, end=None):
+        """Boolean mask of the sales made on the local days ``start`` to ``end``."""
+        days = self.days()
+        keep = np.ones(len(days), dtype=bool)
+        if start:
+            keep &= days >= (start - EPOCH).days
+        if end:
+            keep &= days <= (end - EPOCH).days
+        return keep
+
+    def monthly_totals(self, start=None, end=None):
+        """``[(first day of month, total sales)]`` for months with sales, oldest first."""
+        keep = self.mask(start, end)
+        months = self.columns['local_ts'][keep].astype('datetime64[s]').astype('datetime64[M]').astype('int64')
+        if not len(months):
+            return []
+        first = months.min()
+        totals = np.bincount(months - first, weights=self.columns['total_cents'][keep])
+        return [
+            (np.datetime64(int(first + offset), 'M').astype(date), total / 100)
+            for offset, total in enumerate(totals) if total
+        ]
+
+    def payment_mix(self, start=None, end=None):
+        """Sale count and total per payment method."""
+        keep = self.mask(start, end)
+        codes = self.columns['payment'][keep]
+        counts = np.bincount(codes, minlength=len(PAYMENT_CODES))
+        totals = np.bincount(codes, weights=self.columns['total_cents'][keep], minlength=len(PAYMENT_CODES))
+        return {
+            method: {'count': int(counts[i]), 'total': totals[i] / 100}
+            for i, method in enumerate(PAYMENT_CODES)
+        }
+
+    def basket_sizes(self, start=None, end=None, cap=20):
+        """Number of sales by units in the basket; the last bucket holds ``cap`` or more."""
+        units = np.minimum(self.columns['units'][self.mask(start, end)], cap)
+        return np.bincount(units, minlength=cap + 1).tolist()
+
+    def weekday_profile(self, start=None, end=None):
+        """Average sales per trading day for each weekday, Monday first."""
+        keep = self.mask(start, end)
+        days = self.days()[keep]
+        weekdays = (days + 3) % 7  # 1970-01-01 was a Thursday
+        totals = np.bincount(weekdays, weights=self.columns['total_cents'][keep], minlength=7)
+        trading_days = np.bincount((np.unique(days) + 3) % 7, minlength=7)
+        return [
+            float(total / 100 / count) if count else 0.0
+            for total, count in zip(totals, trading_days)
+        ]
+
+
+def _empty_columns():
+    return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+
+
+def _read_meta(directory):
+    try:
+        with open(directory / 'meta.json') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'high_water': 0, 'segments': []}
+
+
+def _write_meta(directory, meta):
+    tmp = directory / 'meta.json.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, directory / 'meta.json')
+
+
+def _write_segment(directory, name, columns):
+    tmp = directory / 'segments' / f'{name}.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for column, values in columns.items():
+        np.save(tmp / f'{column}.npy', values)
+    target = directory / 'segments' / name
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+
+
+def _read_segment(directory, name):
+    return {
+        column: np.load(directory / 'segments' / name / f'{column}.npy', mmap_mode='r')
+        for column in COLUMNS
+    }
+
+
+def _concat(parts):
+    if len(parts) == 1:
+        return parts[0]
+    return {column: np.concatenate([part[column] for part in parts]) for column in COLUMNS}
+
+
+def _fetch(after, limit=REFRESH_CHUNK):
+    """Columns for up to ``limit`` sales past ``after``, and the last id read."""
+    sales = list(
+        Sales.objects.filter(sales_id__gt=after).order_by('sales_id')
+        .values_list('sales_id', 'sale_date', 'cashier_id', 'payment_method', 'total_amount')[:limit]
+    )
+    if not sales:
+        return None, after
+    last = sales[-1][0]
+    baskets = {
+        sale_id: (lines, units)
+        for sale_id, lines, units in SaleItem.objects.filter(sale_id__gt=after, sale_id__lte=last)
+        .values('sale_id').annotate(lines=Count('id'), units=Sum('quantity'))
+        .values_list('sale_id', 'lines', 'units').order_by()
+    }
+    tz = timezone.get_current_timezone()
+    payment_codes = {code: i for i, code in enumerate(PAYMENT_CODES)}
+    rows = []
+    for sale_id, sale_date, cashier_id, payment_method, total in sales:
+        lines, units = baskets.get(sale_id, (0, 0))
+        if not lines:
+            continue  # abandoned sale page, nothing was sold
+        # Wall-clock seconds since 1970 in the shop's time zone
+        local = sale_date.astimezone(tz).replace(tzinfo=None)
+        rows.append((
+            sale_id,
+            int((local - LOCAL_EPOCH).total_seconds()),
+            -1 if cashier_id is None else cashier_id,
+            payment_codes.get(payment_method, 0),
+            int(round(total * 100)),
+            lines,
+            units,
+        ))
+    if not rows:
+        return _empty_columns(), last
+    values = list(zip(*rows))
+    return {
+        column: np.array(values[i], dtype=dtype)
+        for i, (column, dtype) in enumerate(COLUMNS.items())
+    }, last
+
+
+def refresh(directory=None):
+    """Append sales past the high-water mark as a new segment and return the snapshot."""
+    directory = Path(directory or snapshot_dir())
+    with _lock:
+        directory.mkdir(parents=True, exist_ok=True)
+        meta = _read_meta(directory)
+        parts = []
+        high_water = meta['high_water']
+        while True:
+            columns, last = _fetch(high_water)
+            if columns is None:
+                break
+            high_water = last
+            if len(columns['sales_id']):
+                parts.append(columns)
+
+        if high_water != meta['high_water']:
+            segments = list(meta['segments'])
+            if parts:
+                name = f"{meta['high_water'] + 1:012d}-{high_water:012d}"
+                _write_segment(directory, name, _concat(parts))
+                segments.append(name)
+            meta = {'high_water': high_water, 'segments': segments}
+            if len(segments) > MAX_SEGMENTS:
+                meta = _compact(directory, meta)
+            _write_meta(directory, meta)
+        return _load(directory, meta)
+
+
+def _compact(directory, meta):
+    """Merge every segment into one."""
+    # Segments left over from the previous compaction are no longer listed
+    # anywhere, so any process still reading them has long moved on
+    listed = set(meta['segments'])
+    for path in (directory / 'segments').iterdir():
+        if path.name not in listed:
+            shutil.rmtree(path, ignore_errors=True)
+    columns = _concat([_read_segment(directory, name) for name in meta['segments']])
+    name = f"000000000001-{meta['high_water']:012d}"
+    _write_segment(directory, name, {column: np.asarray(values) for column, values in columns.items()})
+    return {'high_water': meta['high_water'], 'segments': [name]}
+
+
+def _load(directory, meta):
+    """Snapshot for ``meta``, reusing the segments this process already has in memory."""
+    global _loaded
+    segments = tuple(meta['segments'])
+    if _loaded is not None and _loaded.segments == segments:
+        return _loaded
+    if _loaded is not None and segments[:len(_loaded.segments)] == _loaded.segments and _loaded.segments:
+        parts = [_loaded.columns] + [_read_segment(directory, name) for name in segments[len(_loaded.segments):]]
+    else:
+        parts = [_read_segment(directory, name) for name in segments]
+    columns = _concat(parts) if parts else _empty_columns()
+    _loaded = SalesSnapshot(columns, meta['high_water'], segments)
+    return _loaded
+
+
+def load(directory=None):
+    """The snapshot as last refreshed, without querying the database."""
+    directory = Path(directory or snapshot_dir())
+    with _lock:
+        return _load(directory, _read_meta(directory))
+
+
+def rebuild(directory=None):
+    """Throw the snapshot away and take it again from the first sale."""
+    global _loaded
+    directory = Path(directory or snapshot_dir())
+    with _lock:
+        shutil.rmtree(directory, ignore_errors=True)
+        _loaded = None
+    return refresh(directory)
@@ -0,0 +1,197 @@
+"""Retention for the activity log.
+
+Entries older than ``ACTIVITY_LOG_RETENTION_DAYS`` are moved out of the
+``activity_log`` table into gzip-compressed JSON-lines files under
+``ACTIVITY_ARCHIVE_DIR``, one per month and run
+(``activity-2025-03-20251002T020000a1b2c3.jsonl.gz``), so the table the activity
+page reads only ever holds recent history. A run writes each file under a
+temporary name, syncs it and renames it into place, and only then deletes
+the rows it wrote. If it is interrupted before the rename, nothing was
+deleted and the next run starts over; if after, the next run writes the
+remaining rows again and ``search`` skips the repeats.
+
+Archived entries are read back on demand by ``search``, one month file at
+a time, newest month first.
+"""
+import gzip
+import json
+import os
+import re
+import secrets
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from user.models import ActivityLog, User
+from user.rollups import day_bounds
+
+ARCHIVE_CHUNK_SIZE = 5000
+# Longest range one archive search may decompress
+ARCHIVE_SEARCH_DAYS = 31
+FILE_PATTERN = re.compile(r'^activity-(\d{4})-(\d{2})-\w+\.jsonl\.gz$')
+FIELDS = (
+    'id', 'timestamp', 'user_id', 'user__username', 'action', 'description', 'ip_address', 'related_object',
+    'content_type_id', 'object_id',
+)
+
+
+def archive_dir():
+    return Path(getattr(settings, 'ACTIVITY_ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+
+
+def retention_days():
+    return getattr(settings, 'ACTIVITY_LOG_RETENTION_DAYS', 90)
+
+
+def cutoff(days=None):
+    """Start of the oldest local day kept in the table."""
+    first_kept = timezone.localdate() - timedelta(days=retention_days() if days is None else days)
+    return day_bounds(first_kept, first_kept)[0]
+
+
+def search_range(start=None, end=None):
+    """``(start, end)`` for an archive search, at most ``ARCHIVE_SEARCH_DAYS`` long.
+
+    Defaults to the newest archived days; a longer range keeps its end.
+    """
+    end = end or timezone.localdate(cutoff()) - timedelta(days=1)
+    earliest = end - timedelta(days=ARCHIVE_SEARCH_DAYS - 1)
+    return max(start or earliest, earliest), end
+
+
+def _month_paths(directory, month):
+    """Files holding ``month``, oldest run first."""
+    return sorted(directory.glob(f'activity-{month:%Y-%m}-*.jsonl.gz'))
+
+
+def _sync_dir(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def archive_old_entries(days=None, directory=None, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """Move entries older than the retention window into the month files; returns ``{month: count}``."""
+    directory = Path(directory or archive_dir())
+    directory.mkdir(parents=True, exist_ok=True)
+    before = cutoff(days)
+    tz = timezone.get_current_timezone()
+    run = f"{timezone.now():%Y%m%dT%H%M%S}{secrets.token_hex(3)}"
+    files = {}
+    moved = {}
+    chunks = []
+    last = 0
+    try:
+        while True:
+            rows = list(
+                ActivityLog.objects.filter(timestamp__lt=before, id__gt=last)
+                .order_by('id').values_list(*FIELDS)[:chunk_size]
+            )
+            if not rows:
+                break
+            for row in rows:
+                entry = dict(zip(FIELDS, row))
+                entry['username'] = entry.pop('user__username')
+                month = entry['timestamp'].astimezone(tz).date().replace(day=1)
+                entry['timestamp'] = entry['timestamp'].isoformat()
+                if month not in files:
+                    tmp = directory / f'activity-{month:%Y-%m}-{run}.jsonl.gz.tmp'
+                    f = open(tmp, 'wb')
+                    files[month] = (tmp, f, gzip.GzipFile(fileobj=f, mode='wb'))
+                files[month][2].write((json.dumps(entry) + '\n').encode())
+                moved[month] = moved.get(month, 0) + 1
+            chunks.append((rows[0][0], rows[-1][0]))
+            last = rows[-1][0]
+
+        for tmp, f, gz in files.values():
+            gz.close()
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+        for tmp, _, _ in files.values():
+            os.replace(tmp, tmp.with_suffix(''))
+        _sync_dir(directory)
+    except BaseException:
+        for tmp, f, gz in files.values():
+            f.close()
+            tmp.unlink(missing_ok=True)
+        raise
+
+    # Every old entry with an id in these ranges is now safely on disk
+    for first, last in chunks:
+        ActivityLog.objects.filter(timestamp__lt=before, id__gte=first, id__lte=last).delete()
+    return moved
+
+
+def months(directory=None):
+    """Archived months, newest first."""
+    directory = Path(directory or archive_dir())
+    if not directory.is_dir():
+        return []
+    found = []
+    for path in directory.iterdir():
+        match = FILE_PATTERN.match(path.name)
+        if match:
+            found.append(date(int(match[1]), int(match[2]), 1))
+    return sorted(set(found), reverse=True)
+
+
+def _read(path):
+    """Entries of one archive file, oldest first."""
+    with gzip.open(path, 'rt') as f:
+        return [json.loads(line) for line in f]
+
+
+def _matches(entry, start, end, action, user_id, text):
+    if action and entry['action'] != action:
+        return False
+    if user_id and str(entry['user_id']) != str(user_id):
+        return False
+    if start and entry['timestamp'] < start:
+        return False
+    if end and entry['timestamp'] >= end:
+        return False
+    if text:
+        text = text.lower()
+        return any(text in (entry[field] or '').lower() for field in ('description', 'username', 'related_object'))
+    return True
+
+
+def search(start=None, end=None, action='', user_id='', text='', directory=None):
+    """Archived entries on the local days ``start`` to ``end`` matching the filters, newest first.
+
+    Yields unsaved ``ActivityLog`` instances (with a stand-in ``user`` that
+    only carries the username), so they render like live entries.
+    """
+    directory = Path(directory or archive_dir())
+    lower = day_bounds(start, start)[0] if start else None
+    upper = day_bounds(end, end)[1] if end else None
+    for month in months(directory):
+        if start and month < start.replace(day=1):
+            break
+        if end and month > end:
+            continue
+        seen = set()
+        entries = []
+        for entry in (entry for path in _month_paths(directory, month) for entry in _read(path)):
+            if entry['id'] in seen:
+                continue
+            seen.add(entry['id'])
+            entry['timestamp'] = datetime.fromisoformat(entry['timestamp'])
+            if _matches(entry, lower, upper, action, user_id, text):
+                entries.append(entry)
+        entries.sort(key=lambda entry: (entry['timestamp'], entry['id']), reverse=True)
+        for entry in entries:
+            log = ActivityLog(
+                id=entry['id'], timestamp=entry['timestamp'], user_id=entry['user_id'],
+                action=entry['action'], description=entry['description'],
+                ip_address=entry['ip_address'], related_object=entry['related_object'],
+                content_type_id=entry.get('content_type_id'), object_id=entry.get('object_id'),
+            )
+            if entry['user_id'] is not None:
+                log.user = User(id=entry['user_id'], username=entry['username'] or '')
+            yield log
@@ -0,0 +1,154 @@
+"""In-process, read-through cache of the product catalog.
+
+The POS grid, search results and price lookups are served from a compact
+per-process snapshot instead of querying ``Product``/``Category`` on every
+request. The snapshot is tagged with a version number kept in Django's
+cache; saving or deleting a product or category bumps the version, so the
+next read rebuilds the snapshot. With a shared cache backend every process
+sees the bump at once; with the default per-process cache a snapshot is
+also rebuilt once it is ``CATALOG_MAX_AGE`` seconds old.
+
+Stock sold at checkout is patched into the snapshot in place rather than
+throwing it away, since sales happen far more often than catalog edits.
+Restocking goes through ``Product.save()`` and invalidates as usual.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from user.models import Category, Product
+
+VERSION_KEY = 'catalog:version'
+CATALOG_MAX_AGE = 60
+
+CatalogProduct = namedtuple('CatalogProduct', [
+    'id', 'name', 'sku', 'price', 'stock', 'min_stock', 'stock_level',
+    'category_id', 'category_name',
+])
+CatalogCategory = namedtuple('CatalogCategory', ['id', 'name'])
+
+_lock = threading.Lock()
+_snapshot = None
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+_stats_lock = threading.Lock()
+
+
+class Snapshot:
+    def __init__(self, version, products, categories):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.products = products
+        self.categories = categories
+        self.positions = {product.id: position for position, product in enumerate(products)}
+        self.by_id = {product.id: product for product in products}
+        self.by_sku = {product.sku: product for product in products if product.sku}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def _build(version):
+    categories = [
+        CatalogCategory(*row)
+        for row in Category.objects.order_by('name').values_list('id', 'name')
+    ]
+    products = [
+        CatalogProduct(*row)
+        for row in Product.objects.order_by('name').values_list(
+            'id', 'name', 'sku', 'price', 'stock', 'min_stock', 'stock_level',
+            'category_id', 'category__name',
+        )
+    ]
+    return Snapshot(version, products, categories)
+
+
+def get_catalog():
+    """Return the current catalog snapshot, rebuilding it if it is stale."""
+    global _snapshot
+    version = _current_version()
+    snapshot = _snapshot
+    if (snapshot is not None and snapshot.version == version
+            and time.monotonic() - snapshot.built_at < CATALOG_MAX_AGE):
+        _count('hits')
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        if (snapshot is None or snapshot.version != version
+                or time.monotonic() - snapshot.built_at >= CATALOG_MAX_AGE):
+            _count('misses')
+            # The version is read before the rows, so an edit made while
+            # building leaves this snapshot already stale
+            snapshot = _snapshot = _build(version)
+        else:
+            _count('hits')
+    return snapshot
+
+
+def invalidate():
+    """Throw away every process's snapshot."""
+    global _snapshot
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+    _snapshot = None
+    _count('invalidations')
+
+
+def apply_stock(stocks):
+    """Patch ``{product_id: new_stock}`` into this process's snapshot.
+
+    Stock is advisory here (checkout re-checks it in the database), so
+    other processes are not forced to rebuild; they pick the new levels up
+    with their next rebuild.
+    """
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is None:
+            return
+        for product_id, stock in stocks.items():
+            position = snapshot.positions.get(product_id)
+            if position is None:
+                continue
+            product = snapshot.products[position]
+            product = product._replace(stock=stock, stock_level=Product.level_for(stock, product.min_stock))
+            snapshot.products[position] = product
+            snapshot.by_id[product_id] = product
+            if product.sku:
+                snapshot.by_sku[product.sku] = product
+
+
+def stats():
+    """Hit/miss counters for this process."""
+    snapshot = _snapshot
+    with _stats_lock:
+        counters = dict(_stats)
+    return {
+        **counters,
+        'version': snapshot.version if snapshot else None,
+        'products': len(snapshot.products) if snapshot else 0,
+    }
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def _catalog_changed(sender, **kwargs):
+    transaction.on_commit(invalidate)
@@ -0,0 +1,513 @@
+"""Checkout engine used by the POS views.
+
+A whole cart is committed in a single transaction with a fixed number of
+queries, whatever the size of the basket:
+
+    1. one SELECT fetching every product in the cart (before the transaction)
+    2. one INSERT for the sale, which also claims the idempotency key
+    3. one conditional UPDATE decrementing stock (refuses to go negative)
+    4. one bulk INSERT for the sale items
+    5. one INSERT for the receipt
+    6. one UPDATE (or INSERT, first sale of the day or hour) for each of the
+       daily and hourly rollups, and one upsert for the per-product rollup
+"""
+import json
+import secrets
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.core import signing
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from user import catalog, rollups
+from user.sqlite import immediate
+from user.models import Product, Sales, SaleItem, Receipt
+
+
+class CheckoutError(Exception):
+    """Raised when a cart cannot be turned into a sale."""
+
+
+class ProductNotFound(CheckoutError):
+    pass
+
+
+class InsufficientStock(CheckoutError):
+    def __init__(self, product, requested):
+        self.product = product
+        self.requested = requested
+        super().__init__(
+            f'Insufficient stock for {product.name}. '
+            f'Available: {product.stock}, Requested: {requested}'
+        )
+
+
+# Sale pages are reserved with a signed token instead of a database row
+SALE_TOKEN_SALT = 'user.checkout.sale'
+SALE_TOKEN_MAX_AGE = 60 * 60 * 24
+
+
+def issue_sale_token():
+    """Reserve a sale for a freshly opened POS page without writing anything."""
+    return signing.dumps({'nonce': secrets.token_hex(16)}, salt=SALE_TOKEN_SALT)
+
+
+def read_sale_token(token):
+    """Return the nonce carried by ``token``, rejecting forged or stale tokens."""
+    try:
+        payload = signing.loads(token, salt=SALE_TOKEN_SALT, max_age=SALE_TOKEN_MAX_AGE)
+    except signing.SignatureExpired:
+        raise CheckoutError('This sale page has expired, please reload it.')
+    except signing.BadSignature:
+        raise CheckoutError('Invalid sale reference.')
+    return payload['nonce']
+
+
+# How long a checkout's idempotency key is remembered in the cache
+IDEMPOTENCY_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+# Largest number of offline sales accepted in one upload
+MAX_BATCH_SIZE = 500
+# How far back an offline sale may be dated, and how fast a terminal clock may run
+MAX_CAPTURE_AGE = timedelta(days=30)
+CAPTURE_CLOCK_SKEW = timedelta(minutes=5)
+
+
+class CheckoutResult:
+    """The sale, its receipt and the line items created for it.
+
+    ``created`` is False when an earlier checkout with the same
+    idempotency key is being returned instead of a new sale.
+    """
+
+    def __init__(self, sale, receipt, items, created=True):
+        self.sale = sale
+        self.receipt = receipt
+        self.items = items
+        self.created = created
+
+    @classmethod
+    def replay(cls, sale_id):
+        """Load a previously committed checkout."""
+        sale = (
+            Sales.objects.select_related('receipt', 'cashier')
+            .prefetch_related('items__product')
+            .get(sales_id=sale_id)
+        )
+        return cls(sale, sale.receipt, list(sale.items.all()), created=False)
+
+
+def _idempotency_cache_key(key):
+    return f'checkout:idempotency:{key}'
+
+
+def find_idempotent_sale(key):
+    """Return the id of the sale already recorded for ``key``, if any.
+
+    The cache answers repeated submissions without a query; the unique
+    index on ``Sales.idempotency_key`` is the authority when it misses.
+    """
+    sale_id = cache.get(_idempotency_cache_key(key))
+    if sale_id is None:
+        sale_id = Sales.objects.filter(idempotency_key=key).values_list('sales_id', flat=True).first()
+        if sale_id is not None:
+            cache.set(_idempotency_cache_key(key), sale_id, IDEMPOTENCY_CACHE_TIMEOUT)
+    return sale_id
+
+
+def parse_cart(cart_data):
+    """Turn the cart posted by the POS page into ``{product_id: quantity}``.
+
+    Lines for the same product are merged so each product is only
+    decremented once.
+    """
+    quantities = {}
+    for item in cart_data:
+        try:
+            product_id = int(item['id'])
+            quantity = int(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise CheckoutError('Invalid cart line.')
+        if quantity <= 0:
+            raise CheckoutError('Quantities must be greater than zero.')
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    if not quantities:
+        raise CheckoutError('Cart is empty!')
+    return quantities
+
+
+def parse_amount(value):
+    """Parse an optional money amount, returning ``None`` when missing."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool) or not isinstance(value, (str, int, float, Decimal)):
+        raise CheckoutError('Amount paid must be a number.')
+    try:
+        amount = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise CheckoutError('Amount paid must be a number.')
+    if not amount.is_finite() or amount < 0:
+        raise CheckoutError('Amount paid must be a number.')
+    return amount.quantize(Decimal('0.01'))
+
+
+def validate_idempotency_key(key):
+    """Return ``key``, or ``None`` when missing; it must be a string of up to 64 characters."""
+    if key is None or key == '':
+        return None
+    if not isinstance(key, str):
+        raise CheckoutError('Idempotency key must be a string.')
+    if len(key) > 64:
+        raise CheckoutError('Idempotency key is too long.')
+    return key
+
+
+def parse_captured_at(value, now):
+    """When an offline sale was made, from an ISO 8601 string; ``None`` when missing.
+
+    Must lie within ``MAX_CAPTURE_AGE`` before ``now``; a terminal clock up
+    to ``CAPTURE_CLOCK_SKEW`` fast is tolerated and read as ``now``.
+    """
+    if value is None or value == '':
+        return None
+    captured = None
+    if isinstance(value, str):
+        try:
+            captured = parse_datetime(value)
+        except ValueError:
+            pass
+    if captured is None:
+        raise CheckoutError('captured_at must be an ISO 8601 date and time.')
+    if timezone.is_naive(captured):
+        captured = timezone.make_aware(captured)
+    if captured > now + CAPTURE_CLOCK_SKEW:
+        raise CheckoutError('captured_at is in the future.')
+    if captured < now - MAX_CAPTURE_AGE:
+        raise CheckoutError(f'captured_at is more than {MAX_CAPTURE_AGE.days} days ago.')
+    return min(captured, now)
+
+
+def validate_methods(payment_method, receipt_method):
+    if not isinstance(payment_method, str) or payment_method not in dict(Sales.PAYMENT_CHOICES):
+        raise CheckoutError('Invalid payment method.')
+    if not isinstance(receipt_method, str) or receipt_method not in dict(Sales.RECEIPT_CHOICES):
+        raise CheckoutError('Invalid receipt method.')
+
+
+def fetch_products(quantities):
+    """Fetch every product in the cart with one query, checking stock."""
+    products = Product.objects.in_bulk(list(quantities))
+    if len(products) != len(quantities):
+        raise ProductNotFound('One or more products not found!')
+    for product_id, quantity in quantities.items():
+        product = products[product_id]
+        if product.stock < quantity:
+            raise InsufficientStock(product, quantity)
+    return products
+
+
+def decrement_stock(quantities, products):
+    """Deduct ``quantities`` from stock with a single conditional UPDATE.
+
+    Every row only matches while it still holds enough stock, so a
+    concurrent sale can never drive stock below zero; if any row does not
+    match, the whole cart is rejected.
+    """
+    # Group lines by quantity so the statement stays small for big baskets
+    by_quantity = {}
+    for product_id, quantity in quantities.items():
+        by_quantity.setdefault(quantity, []).append(product_id)
+
+    new_stock = Case(
+        *[When(id__in=ids, then=F('stock') - Value(quantity))
+          for quantity, ids in by_quantity.items()],
+        default=F('stock'),
+    )
+    enough_stock = Q()
+    for quantity, ids in by_quantity.items():
+        enough_stock |= Q(id__in=ids, stock__gte=quantity)
+
+    updated = Product.objects.filter(enough_stock).update(
+        stock=new_stock,
+        stock_level=Product.level_expression(new_stock),
+    )
+    if updated != len(quantities):
+        # Someone else sold the stock between our read and this write
+        current = Product.objects.in_bulk(list(quantities))
+        for product_id, quantity in quantities.items():
+            product = current.get(product_id)
+            if product is None:
+                raise ProductNotFound('One or more products not found!')
+            if product.stock < quantity:
+                raise InsufficientStock(product, quantity)
+        raise CheckoutError('Stock changed during checkout, please try again.')
+
+    for product_id, quantity in quantities.items():
+        products[product_id].stock -= quantity
+
+
+def checkout_cart(cart_data, cashier=None, payment_method='cash',
+                  amount_paid=None, receipt_method='none', idempotency_key=None):
+    """Record ``cart_data`` as a completed sale and return a ``CheckoutResult``.
+
+    Prices are taken from the catalog, not from the posted cart. Nothing is
+    written unless the whole cart can be sold. When ``idempotency_key`` has
+    already been used, the original sale is returned and nothing is written.
+    """
+    idempotency_key = validate_idempotency_key(idempotency_key)
+    if idempotency_key:
+        sale_id = cache.get(_idempotency_cache_key(idempotency_key))
+        if sale_id is not None:
+            return CheckoutResult.replay(sale_id)
+
+    validate_methods(payment_method, receipt_method)
+    amount_paid = parse_amount(amount_paid)
+    quantities = parse_cart(cart_data)
+    try:
+        products = fetch_products(quantities)
+    except CheckoutError:
+        # The original submission may have taken the last of the stock
+        sale_id = find_idempotent_sale(idempotency_key) if idempotency_key else None
+        if sale_id is None:
+            raise
+        return CheckoutResult.replay(sale_id)
+    total_amount = sum(
+        (products[product_id].price * quantity
+         for product_id, quantity in quantities.items()),
+        Decimal('0.00'),
+    )
+
+    try:
+        # Take SQLite's write lock at BEGIN instead of upgrading a read lock
+        # half way through, which fails at once if another till got there first
+        with immediate():
+            sale = Sales.objects.create(
+                total_amount=total_amount,
+                payment_method=payment_method,
+                amount_paid=amount_paid,
+                receipt_method=receipt_method,
+                cashier=cashier,
+                idempotency_key=idempotency_key or None,
+            )
+            decrement_stock(quantities, products)
+            items = SaleItem.objects.bulk_create([
+                SaleItem(
+                    sale=sale,
+                    product=products[product_id],
+                    quantity=quantity,
+                    unit_price=products[product_id].price,
+                    unit_cost=products[product_id].cost_price,
+                )
+                for product_id, quantity in quantities.items()
+            ])
+            receipt = Receipt.objects.create(sale=sale)
+            rollups.record_sales([sale], items)
+            sold = {product_id: products[product_id].stock for product_id in quantities}
+            transaction.on_commit(lambda: catalog.apply_stock(sold))
+    except IntegrityError:
+        # A concurrent submission with the same key committed first
+        sale_id = find_idempotent_sale(idempotency_key) if idempotency_key else None
+        if sale_id is None:
+            raise
+        return CheckoutResult.replay(sale_id)
+
+    if idempotency_key:
+        cache.set(_idempotency_cache_key(idempotency_key), sale.sales_id, IDEMPOTENCY_CACHE_TIMEOUT)
+    return CheckoutResult(sale, receipt, items)
+
+
+def receipt_payload(result):
+    """Compact JSON-ready receipt for a ``CheckoutResult``."""
+    sale = result.sale
+    amount_paid = sale.amount_paid
+    change = max(Decimal('0.00'), amount_paid - sale.total_amount) if amount_paid else Decimal('0.00')
+    return {
+        'sale_id': sale.sales_id,
+        'receipt_number': result.receipt.receipt_number,
+        'issued_at': result.receipt.issued_at.isoformat(),
+        'created': result.created,
+        'cashier': sale.cashier_name,
+        'payment_method': sale.payment_method,
+        'receipt_method': sale.receipt_method,
+        'total': str(sale.total_amount),
+        'amount_paid': str(amount_paid) if amount_paid is not None else None,
+        'change': str(change),
+        'items': [
+            {
+                'product_id': item.product_id,
+                'name': item.product.name,
+                'quantity': item.quantity,
+                'unit_price': str(item.unit_price),
+                'total': str(item.total_price),
+            }
+            for item in result.items
+        ],
+    }
+
+
+class _StockChanged(Exception):
+    """Stock moved between reading it and writing the batch; start over."""
+
+
+def checkout_batch(orders, cashier=None, attempts=3):
+    """Apply a batch of sales captured offline and return one result per sale.
+
+    Each order is a dict holding a ``cart`` in the same format as the POS
+    page's ``cart_data`` plus optional ``payment_method``, ``amount_paid``,
+    ``receipt_method``, ``idempotency_key`` and ``captured_at`` (when the
+    sale was made, ISO 8601; upload time by default). Orders are applied in the
+    order given; one that no longer fits in stock is reported as a
+    conflict without affecting the rest. All accepted sales are committed
+    together in one transaction with a fixed number of queries.
+    """
+    if len(orders) > MAX_BATCH_SIZE:
+        raise CheckoutError(f'A batch can hold at most {MAX_BATCH_SIZE} sales.')
+
+    results = [{'index': index} for index in range(len(orders))]
+    pending = []
+    now = timezone.now()
+    for index, order in enumerate(orders):
+        try:
+            if not isinstance(order, dict):
+                raise CheckoutError('Each sale must be an object.')
+            cart = order.get('cart', [])
+            if isinstance(cart, str):
+                cart = json.loads(cart)
+            if not isinstance(cart, list):
+                raise CheckoutError('Cart must be a list.')
+            payment_method = order.get('payment_method', 'cash')
+            receipt_method = order.get('receipt_method', 'none')
+            validate_methods(payment_method, receipt_method)
+            key = validate_idempotency_key(order.get('idempotency_key'))
+            pending.append({
+                'index': index,
+                'quantities': parse_cart(cart),
+                'payment_method': payment_method,
+                'receipt_method': receipt_method,
+                'amount_paid': parse_amount(order.get('amount_paid')),
+                'idempotency_key': key,
+                'sale_date': parse_captured_at(order.get('captured_at'), now) or now,
+            })
+        except (CheckoutError, ValueError) as e:
+            results[index].update(status='invalid', error=str(e))
+        if isinstance(order, dict) and order.get('idempotency_key'):
+            results[index]['idempotency_key'] = order['idempotency_key']
+
+    for attempt in range(attempts):
+        try:
+            _apply_batch(pending, results, cashier)
+            break
+        except (_StockChanged, IntegrityError):
+            if attempt == attempts - 1:
+                raise CheckoutError('Stock changed while applying the batch, please retry.')
+    return results
+
+
+def _apply_batch(pending, results, cashier):
+    # Keys already recorded, by an earlier upload or earlier in this batch
+    keys = [order['idempotency_key'] for order in pending if order['idempotency_key']]
+    recorded = dict(
+        Sales.objects.filter(idempotency_key__in=keys).values_list('idempotency_key', 'sales_id')
+    ) if keys else {}
+
+    product_ids = {pid for order in pending for pid in order['quantities']}
+    products = Product.objects.in_bulk(list(product_ids))
+    remaining = {pid: product.stock for pid, product in products.items()}
+
+    accepted = []
+    repeats = []
+    claimed = {}
+    demand = {}
+    for order in pending:
+        # Start from a clean result in case this is a retry
+        result = results[order['index']] = {'index': order['index']}
+        key = order['idempotency_key']
+        if key:
+            result['idempotency_key'] = key
+        if key in recorded:
+            result.update(status='duplicate', sale_id=recorded[key],
+                          receipt_number=Receipt.number_for(recorded[key]))
+            continue
+        if key in claimed:
+            repeats.append((result, claimed[key]))
+            continue
+
+        conflicts = []
+        for product_id, quantity in order['quantities'].items():
+            if product_id not in products:
+                conflicts.append({'product_id': product_id, 'error': 'Product not found.'})
+            elif remaining[product_id] < quantity:
+                conflicts.append({
+                    'product_id': product_id,
+                    'name': products[product_id].name,
+                    'available': remaining[product_id],
+                    'requested': quantity,
+                })
+        if conflicts:
+            result.update(status='conflict', conflicts=conflicts)
+            continue
+
+        for product_id, quantity in order['quantities'].items():
+            remaining[product_id] -= quantity
+            demand[product_id] = demand.get(product_id, 0) + quantity
+        if key:
+            claimed[key] = result
+        accepted.append(order)
+
+    if not accepted:
+        return
+
+    with immediate():
+        sales = Sales.objects.bulk_create([
+            Sales(
+                total_amount=sum(
+                    (products[pid].price * quantity for pid, quantity in order['quantities'].items()),
+                    Decimal('0.00'),
+                ),
+                payment_method=order['payment_method'],
+                amount_paid=order['amount_paid'],
+                receipt_method=order['receipt_method'],
+                cashier=cashier,
+                idempotency_key=order['idempotency_key'],
+                sale_date=order['sale_date'],
+            )
+            for order in accepted
+        ])
+        try:
+            decrement_stock(demand, products)
+        except CheckoutError:
+            raise _StockChanged()
+        items = SaleItem.objects.bulk_create([
+            SaleItem(sale=sale, product=products[pid], quantity=quantity,
+                     unit_price=products[pid].price, unit_cost=products[pid].cost_price)
+            for sale, order in zip(sales, accepted)
+            for pid, quantity in order['quantities'].items()
+        ])
+        receipts = Receipt.objects.bulk_create([
+            Receipt(sale=sale, receipt_number=Receipt.number_for(sale.sales_id))
+            for sale in sales
+        ])
+        rollups.record_sales(sales, items)
+        sold = {product_id: products[product_id].stock for product_id in demand}
+        transaction.on_commit(lambda: catalog.apply_stock(sold))
+
+    for sale, receipt, order in zip(sales, receipts, accepted):
+        results[order['index']].update(
+            status='created',
+            sale_id=sale.sales_id,
+            receipt_number=receipt.receipt_number,
+            total=str(sale.total_amount),
+        )
+        if order['idempotency_key']:
+            cache.set(_idempotency_cache_key(order['idempotency_key']), sale.sales_id,
+                      IDEMPOTENCY_CACHE_TIMEOUT)
+
+    # Later copies of a sale within the same upload point at the first one
+    for result, original in repeats:
+        result.update(status='duplicate', sale_id=original['sale_id'],
+                      receipt_number=original['receipt_number'])
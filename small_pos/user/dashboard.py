@@ -0,0 +1,82 @@
+"""Numbers behind the dashboard cards.
+
+Every card is computed from the catalog snapshot (product, category and
+low stock counts) and a single aggregate over the daily sales rollup
+(today, yesterday and all-time sales), whose rows are keyed by local day.
+Results are cached for ``DASHBOARD_CACHE_TIMEOUT`` seconds, once for the
+whole store and once per cashier, so pages left on auto-refresh cost next
+to nothing.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Prefetch, Q, Sum
+from django.utils import timezone
+
+from user.catalog import get_catalog
+from user.models import DailySalesSummary, Receipt, SaleItem
+
+DASHBOARD_CACHE_TIMEOUT = 5
+
+
+def _cache_key(cashier):
+    return f'dashboard:cashier:{cashier.pk}' if cashier is not None else 'dashboard:store'
+
+
+def _compute(cashier):
+    today = timezone.localdate()
+    yesterday = today - timedelta(days=1)
+
+    summaries = DailySalesSummary.objects.all()
+    if cashier is not None:
+        summaries = summaries.filter(cashier=cashier)
+    sales = summaries.aggregate(
+        today_count=Sum('sales_count', filter=Q(day=today)),
+        today_gross=Sum('gross_total', filter=Q(day=today)),
+        yesterday_gross=Sum('gross_total', filter=Q(day=yesterday)),
+        total_count=Sum('sales_count'),
+    )
+    today_gross = sales['today_gross'] or Decimal('0.00')
+    yesterday_gross = sales['yesterday_gross'] or Decimal('0.00')
+
+    snapshot = get_catalog()
+    return {
+        'day': today.isoformat(),
+        'total_sales_amount': today_gross.quantize(Decimal('0.01')),
+        'today_sales_count': sales['today_count'] or 0,
+        'sales_change': (
+            round((today_gross - yesterday_gross) / yesterday_gross * 100) if yesterday_gross else None
+        ),
+        'transaction_count': sales['total_count'] or 0,
+        'total_products': len(snapshot.products),
+        'in_stock': sum(1 for product in snapshot.products if product.stock > 0),
+        'low_stock_count': sum(1 for product in snapshot.products if product.stock_level == 'Low Stock'),
+        'total_categories': len(snapshot.categories),
+    }
+
+
+def dashboard_stats(cashier=None):
+    """Card figures for the whole store, or for one cashier's own sales."""
+    key = _cache_key(cashier)
+    stats = cache.get(key)
+    if stats is None:
+        stats = _compute(cashier)
+        cache.set(key, stats, DASHBOARD_CACHE_TIMEOUT)
+    return stats
+
+
+def stats_payload(stats):
+    """``stats`` with money as strings, ready for JSON."""
+    return {**stats, 'total_sales_amount': str(stats['total_sales_amount'])}
+
+
+def recent_receipts(cashier=None, limit=3):
+    """The latest receipts with their sale, cashier and items, in two queries."""
+    receipts = Receipt.objects.select_related('sale__cashier').prefetch_related(
+        Prefetch('sale__items', queryset=SaleItem.objects.select_related('product'))
+    )
+    if cashier is not None:
+        # Walks the (cashier, sale_date) index backwards and stops after ``limit``
+        return receipts.filter(sale__cashier=cashier).order_by('-sale__sale_date')[:limit]
+    return receipts.order_by('-issued_at')[:limit]
@@ -0,0 +1,114 @@
+"""Streaming CSV exports of sales, sale items and receipts.
+
+Rows are read in primary-key order a chunk at a time (each chunk starts
+after the last key of the previous one, so no OFFSET scans) and written
+out as they are read, so exporting years of history runs in constant
+memory and the download starts straight away.
+"""
+import csv
+
+from django.utils import timezone
+
+from user.models import Receipt, SaleItem, Sales
+from user.rollups import day_bounds
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object whose ``write`` hands the line straight back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def _local(value, tz):
+    return value.astimezone(tz).strftime('%Y-%m-%d %H:%M:%S') if value else ''
+
+
+def _cashier(username, first_name, last_name):
+    """Full name, else username, else 'Unknown' (as ``Sales.cashier_name``)."""
+    return ' '.join(part for part in (first_name, last_name) if part) or username or 'Unknown'
+
+
+class Export:
+    """One exportable dataset: which rows, which columns and how to format them."""
+
+    def __init__(self, model, key, date_field, cashier_field, header, fields, row):
+        self.model = model
+        self.key = key
+        self.date_field = date_field
+        self.cashier_field = cashier_field
+        self.header = header
+        self.fields = fields
+        self.row = row
+
+    def queryset(self, start=None, end=None, cashier=None):
+        rows = self.model.objects.all()
+        if start:
+            rows = rows.filter(**{f'{self.date_field}__gte': day_bounds(start, start)[0]})
+        if end:
+            rows = rows.filter(**{f'{self.date_field}__lt': day_bounds(end, end)[1]})
+        if cashier is not None:
+            rows = rows.filter(**{self.cashier_field: cashier})
+        return rows
+
+    def chunks(self, queryset, chunk_size=EXPORT_CHUNK_SIZE):
+        """Yield lists of value tuples, walking the primary key instead of using OFFSET."""
+        last = None
+        while True:
+            chunk = queryset.order_by(self.key)
+            if last is not None:
+                chunk = chunk.filter(**{f'{self.key}__gt': last})
+            chunk = list(chunk.values_list(self.key, *self.fields)[:chunk_size])
+            if not chunk:
+                return
+            yield [values[1:] for values in chunk]
+            last = chunk[-1][0]
+            if len(chunk) < chunk_size:
+                return
+
+    def stream(self, start=None, end=None, cashier=None):
+        """Yield the CSV export, the header first and then one string per chunk of rows."""
+        writer = csv.writer(Echo())
+        tz = timezone.get_current_timezone()
+        yield writer.writerow(self.header)
+        for chunk in self.chunks(self.queryset(start, end, cashier)):
+            yield ''.join(writer.writerow(self.row(tz, *values)) for values in chunk)
+
+
+CASHIER_FIELDS = ('username', 'first_name', 'last_name')
+
+EXPORTS = {
+    'sales': Export(
+        Sales, 'sales_id', 'sale_date', 'cashier',
+        ['Sale ID', 'Date', 'Receipt No.', 'Cashier', 'Payment Method', 'Receipt Method',
+         'Total', 'Amount Paid'],
+        ['sales_id', 'sale_date', 'receipt__receipt_number', *(f'cashier__{f}' for f in CASHIER_FIELDS),
+         'payment_method', 'receipt_method', 'total_amount', 'amount_paid'],
+        lambda tz, sale_id, sale_date, receipt, username, first, last, payment, receipt_method, total, paid: [
+            sale_id, _local(sale_date, tz), receipt or '', _cashier(username, first, last), payment,
+            receipt_method, total, '' if paid is None else paid,
+        ],
+    ),
+    'items': Export(
+        SaleItem, 'id', 'sale__sale_date', 'sale__cashier',
+        ['Sale ID', 'Date', 'Receipt No.', 'Product ID', 'SKU', 'Product', 'Category',
+         'Quantity', 'Unit Price', 'Unit Cost', 'Line Total'],
+        ['sale_id', 'sale__sale_date', 'sale__receipt__receipt_number', 'product_id', 'product__sku',
+         'product__name', 'product__category__name', 'quantity', 'unit_price', 'unit_cost'],
+        lambda tz, sale_id, sale_date, receipt, product_id, sku, name, category, quantity, price, cost: [
+            sale_id, _local(sale_date, tz), receipt or '', product_id, sku, name, category,
+            quantity, price, '' if cost is None else cost, quantity * price,
+        ],
+    ),
+    'receipts': Export(
+        Receipt, 'id', 'issued_at', 'sale__cashier',
+        ['Receipt No.', 'Issued At', 'Sale ID', 'Cashier', 'Payment Method', 'Total'],
+        ['receipt_number', 'issued_at', 'sale_id', *(f'sale__cashier__{f}' for f in CASHIER_FIELDS),
+         'sale__payment_method', 'sale__total_amount'],
+        lambda tz, number, issued_at, sale_id, username, first, last, payment, total: [
+            number, _local(issued_at, tz), sale_id, _cashier(username, first, last), payment, total,
+        ],
+    ),
+}
@@ -0,0 +1,133 @@
+"""Shared helpers for the benchmark commands.
+
+Benchmarks never touch the real database: they run against a throw-away
+SQLite file that is migrated from scratch and deleted afterwards.
+"""
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import connection
+
+from user.models import User, Category, Product
+
+
+@contextmanager
+def scratch_database():
+    """Point the default connection at a freshly migrated temporary database."""
+    handle, path = tempfile.mkstemp(prefix='small_pos_bench_', suffix='.sqlite3')
+    os.close(handle)
+    old_name = connection.settings_dict['NAME']
+    connection.settings_dict['TEST']['NAME'] = path
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield path
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def seed_catalog(products, stock=1_000_000, categories=10):
+    """Create a cashier and ``products`` products spread over ``categories``."""
+    cashier = User.objects.create_user(
+        username='bench', email='bench@example.com', password='bench-password',
+        first_name='Bench', last_name='Cashier',
+    )
+    cats = Category.objects.bulk_create([
+        Category(name=f'Category {i}') for i in range(categories)
+    ])
+    Product.objects.bulk_create([
+        Product(
+            name=f'Product {i:06d}',
+            category=cats[i % categories],
+            price=Decimal('1.00') + Decimal(i % 500) / 100,
+            cost_price=Decimal('0.50') + Decimal(i % 300) / 100,
+            stock=stock,
+            min_stock=10,
+            sku=f'SKU{i:08d}',
+        )
+        for i in range(products)
+    ], batch_size=1000)
+    return cashier, list(Product.objects.order_by('id').values_list('id', flat=True))
+
+
+def seed_sales(sales, days, first_product, products, cashier_id):
+    """Insert ``sales`` sales spread evenly over the last ``days`` days, with items and receipts.
+
+    Generated in SQL so a million rows take seconds rather than minutes.
+    """
+    seconds = days * 86400
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < {sales})
+            INSERT INTO sales (total_amount, amount_paid, payment_method, receipt_method, sale_date, cashier_id)
+            SELECT 0, NULL, CASE n % 3 WHEN 0 THEN 'cash' WHEN 1 THEN 'mtn' ELSE 'card' END, 'none',
+                   datetime('now', '-' || (({sales} - n) * {seconds} / {sales}) || ' seconds'), {cashier_id}
+            FROM seq
+        """)
+        # One item per sale, plus a second one on every other sale
+        for offset, step in ((0, 1), (1, 2)):
+            cursor.execute(f"""
+                INSERT INTO sale_item (quantity, unit_price, unit_cost, product_id, sale_id)
+                SELECT 1 + sales_id % 3, product.price, product.cost_price, product.id, sales_id
+                FROM sales JOIN product ON product.id = {first_product} + (sales_id * 7 + {offset}) % {products}
+                WHERE sales_id % {step} = 0
+            """)
+        cursor.execute("""
+            UPDATE sales SET total_amount = (
+                SELECT SUM(quantity * unit_price) FROM sale_item WHERE sale_id = sales.sales_id
+            )
+        """)
+        cursor.execute('UPDATE sales SET amount_paid = total_amount')
+        cursor.execute("""
+            INSERT INTO receipt (receipt_number, issued_at, sale_id)
+            SELECT printf('REC-%06d', sales_id), sale_date, sales_id
+            FROM sales
+        """)
+        cursor.execute('ANALYZE')
+
+
+def seed_activity(count, days, user_id):
+    """Insert ``count`` activity log entries spread over the last ``days`` days."""
+    seconds = days * 86400
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < {count})
+            INSERT INTO activity_log (user_id, action, description, timestamp, related_object)
+            SELECT CASE WHEN n % 4 = 0 THEN NULL ELSE {user_id} END,
+                   CASE n % 3 WHEN 0 THEN 'sale' WHEN 1 THEN 'stock_update' ELSE 'user_login' END,
+                   'Seeded entry ' || n,
+                   datetime('now', '-' || (({count} - n) * {seconds} / {count}) || ' seconds'), ''
+            FROM seq
+        """)
+        cursor.execute('ANALYZE')
+
+
+def timed(func, *args, **kwargs):
+    """Run ``func`` once and return ``(result, elapsed_ms)``."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of ``samples``."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Median / p95 / max of a list of millisecond timings."""
+    return {
+        'median': statistics.median(samples) if samples else 0.0,
+        'p95': percentile(samples, 95),
+        'max': max(samples) if samples else 0.0,
+    }
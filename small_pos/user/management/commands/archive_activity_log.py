@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from user import archive
+
+
+class Command(BaseCommand):
+    help = ('Move activity log entries older than the retention window into compressed '
+            'monthly archive files. Run it daily, e.g. from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            help='Days of history to keep in the table (default ACTIVITY_LOG_RETENTION_DAYS).')
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 0:
+            raise CommandError('--days cannot be negative.')
+        moved = archive.archive_old_entries(options['days'])
+        if not moved:
+            self.stdout.write('Nothing to archive.')
+            return
+        for month, count in sorted(moved.items()):
+            self.stdout.write(f'  {month:%Y-%m}: {count} entr{"y" if count == 1 else "ies"}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {sum(moved.values())} entries to {archive.archive_dir()}.'
+        ))
@@ -0,0 +1,111 @@
+import tempfile
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Exists, OuterRef, Sum
+from django.db.models.functions import TruncMonth
+from django.test import override_settings
+
+from user import analytics
+from user.checkout import checkout_cart
+from user.models import Sales, SaleItem
+
+from ._bench import scratch_database, seed_catalog, seed_sales, summarize, timed
+
+
+def sold_sales():
+    return Sales.objects.filter(Exists(SaleItem.objects.filter(sale=OuterRef('pk'))))
+
+
+def orm_monthly_totals():
+    return [
+        (row['month'].date(), float(row['total']))
+        for row in sold_sales().annotate(
+            month=TruncMonth('sale_date')
+        ).values('month').annotate(total=Sum('total_amount')).order_by('month')
+    ]
+
+
+def orm_payment_mix():
+    rows = {
+        row['payment_method']: row
+        for row in sold_sales().values('payment_method')
+        .annotate(count=Count('sales_id'), total=Sum('total_amount')).order_by()
+    }
+    return {
+        method: {'count': rows[method]['count'] if method in rows else 0,
+                 'total': float(rows[method]['total']) if method in rows else 0.0}
+        for method in analytics.PAYMENT_CODES
+    }
+
+
+def orm_basket_sizes(cap=20):
+    sizes = [0] * (cap + 1)
+    for units in SaleItem.objects.values('sale_id').annotate(units=Sum('quantity')).order_by() \
+            .values_list('units', flat=True).iterator(chunk_size=10_000):
+        sizes[min(units, cap)] += 1
+    return sizes
+
+
+def same(left, right):
+    """Compare results with money rounded to the cent."""
+    if isinstance(left, float) or isinstance(right, float):
+        return round(Decimal(left), 2) == round(Decimal(right), 2)
+    if isinstance(left, dict):
+        return left.keys() == right.keys() and all(same(left[k], right[k]) for k in left)
+    if isinstance(left, (list, tuple)):
+        return len(left) == len(right) and all(same(a, b) for a, b in zip(left, right))
+    return left == right
+
+
+class Command(BaseCommand):
+    help = ('Seed a scratch database with a long sales history and compare the columnar '
+            'analytics snapshot against the equivalent ORM aggregates.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sales', type=int, default=1_000_000)
+        parser.add_argument('--days', type=int, default=3 * 365)
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--new-sales', type=int, default=50,
+                            help='Checkouts made before timing the incremental refresh.')
+
+    def handle(self, *args, **options):
+        if not analytics.available():
+            raise CommandError('NumPy is not installed.')
+
+        with scratch_database(), tempfile.TemporaryDirectory() as directory, \
+                override_settings(ANALYTICS_DIR=directory):
+            cashier, product_ids = seed_catalog(options['products'])
+            self.stdout.write(f"Seeding {options['sales']:,} sales over {options['days']} days...")
+            seed_sales(options['sales'], options['days'], product_ids[0], len(product_ids), cashier.pk)
+
+            snapshot, elapsed = timed(analytics.rebuild)
+            self.stdout.write(f'  initial snapshot of {len(snapshot):,} sales in {elapsed / 1000:.1f}s')
+            for n in range(options['new_sales']):
+                checkout_cart([{'id': product_ids[n % len(product_ids)], 'quantity': 1 + n % 3}], cashier=cashier)
+            snapshot, elapsed = timed(analytics.refresh)
+            self.stdout.write(f"  refresh after {options['new_sales']} new sales in {elapsed:.1f}ms "
+                              f'({len(snapshot.segments)} segments)')
+
+            scenarios = [
+                ('monthly totals', snapshot.monthly_totals, orm_monthly_totals),
+                ('payment mix', snapshot.payment_mix, orm_payment_mix),
+                ('basket sizes', snapshot.basket_sizes, orm_basket_sizes),
+            ]
+            mismatched = []
+            self.stdout.write(f"{'':>16}{'numpy p95':>12}{'orm p95':>12}{'speedup':>10}")
+            for name, vectorised, orm in scenarios:
+                fast = [timed(vectorised) for _ in range(options['runs'])]
+                slow = [timed(orm) for _ in range(options['runs'])]
+                fast_p95 = summarize([elapsed for _, elapsed in fast])['p95']
+                slow_p95 = summarize([elapsed for _, elapsed in slow])['p95']
+                self.stdout.write(
+                    f'{name:>16}{fast_p95:>10.1f}ms{slow_p95:>10.1f}ms{slow_p95 / max(fast_p95, 0.001):>9.0f}x'
+                )
+                if not same(fast[0][0], slow[0][0]):
+                    mismatched.append(name)
+
+        if mismatched:
+            raise CommandError(f"Snapshot disagrees with the database: {', '.join(mismatched)}.")
+        self.stdout.write(self.style.SUCCESS('Snapshot matches the database.'))
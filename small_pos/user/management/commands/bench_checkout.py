@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from user.checkout import checkout_cart
+from user.models import Product, Sales, SaleItem, Receipt
+
+from ._bench import scratch_database, seed_catalog, summarize, timed
+
+
+def legacy_checkout(cart_data, cashier):
+    """The per-line checkout loop ``views.sales`` used before the engine."""
+    total_amount = sum(float(item['price']) * int(item['quantity']) for item in cart_data)
+    sale = Sales.objects.create(total_amount=total_amount, cashier=cashier)
+    for item in cart_data:
+        product = Product.objects.get(id=item['id'])
+        quantity = int(item['quantity'])
+        product.stock -= quantity
+        product.save()
+        SaleItem.objects.create(sale=sale, product=product, quantity=quantity,
+                                unit_price=float(item['price']))
+    Receipt.objects.get_or_create(sale=sale)
+    return sale
+
+
+class Command(BaseCommand):
+    help = 'Benchmark checkout queries and latency against basket size (uses a scratch database).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,5,10,20,40,80',
+                            help='Comma separated basket sizes.')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Checkouts per basket size.')
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--no-legacy', action='store_true',
+                            help='Skip the old per-line checkout loop.')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        engines = [('engine', lambda cart, cashier: checkout_cart(cart, cashier=cashier))]
+        if not options['no_legacy']:
+            engines.append(('legacy', legacy_checkout))
+
+        with scratch_database():
+            cashier, product_ids = seed_catalog(options['products'])
+            prices = dict(Product.objects.values_list('id', 'price'))
+
+            self.stdout.write(f"{'path':<8}{'basket':>8}{'queries':>9}"
+                              f"{'median ms':>11}{'p95 ms':>9}{'max ms':>9}")
+            for size in sizes:
+                for name, run in engines:
+                    timings = []
+                    queries = 0
+                    for n in range(options['repeat']):
+                        offset = (n * size) % max(1, len(product_ids) - size)
+                        cart = [
+                            {'id': pid, 'price': str(prices[pid]), 'quantity': 1}
+                            for pid in product_ids[offset:offset + size]
+                        ]
+                        with CaptureQueriesContext(connection) as ctx:
+                            _, elapsed = timed(run, cart, cashier)
+                        timings.append(elapsed)
+                        queries = len(ctx.captured_queries)
+                    stats = summarize(timings)
+                    self.stdout.write(
+                        f"{name:<8}{size:>8}{queries:>9}{stats['median']:>11.2f}"
+                        f"{stats['p95']:>9.2f}{stats['max']:>9.2f}"
+                    )
@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from user import rollups
+from user.reports import build_report
+
+from ._bench import scratch_database, seed_catalog, seed_sales, summarize, timed
+
+
+class Command(BaseCommand):
+    help = ('Seed a scratch database with a large sales history and check computing the '
+            'reports page stays within a latency budget.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sales', type=int, default=1_000_000)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--budget-ms', type=float, default=250,
+                            help='Fail if any report\'s p95 exceeds this (default 250ms).')
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            cashier, product_ids = seed_catalog(options['products'])
+            self.stdout.write(f"Seeding {options['sales']:,} sales over {options['days']} days...")
+            _, elapsed = timed(
+                seed_sales, options['sales'], options['days'], product_ids[0], len(product_ids), cashier.pk,
+            )
+            self.stdout.write(f'  seeded in {elapsed / 1000:.1f}s')
+            counts, elapsed = timed(rollups.rebuild)
+            self.stdout.write(f'  rolled up {counts} in {elapsed / 1000:.1f}s')
+
+            today = timezone.localdate()
+            scenarios = [
+                ('all time', None, None),
+                ('last 30 days', today - timedelta(days=29), today),
+                ('last year', today - timedelta(days=364), today),
+                ('one old day', today - timedelta(days=200), today - timedelta(days=200)),
+            ]
+
+            over_budget = []
+            for name, start, end in scenarios:
+                samples = []
+                for _ in range(options['runs']):
+                    with CaptureQueriesContext(connection) as queries:
+                        _, elapsed = timed(build_report, start, end)
+                    samples.append(elapsed)
+                stats = summarize(samples)
+                self.stdout.write(
+                    f"{name:>14}: median {stats['median']:7.1f}ms  p95 {stats['p95']:7.1f}ms  "
+                    f"{len(queries)} queries"
+                )
+                if stats['p95'] > options['budget_ms']:
+                    over_budget.append(name)
+
+        if over_budget:
+            raise CommandError(f"Over the {options['budget_ms']:.0f}ms budget: {', '.join(over_budget)}.")
+        self.stdout.write(self.style.SUCCESS(f"All reports within {options['budget_ms']:.0f}ms."))
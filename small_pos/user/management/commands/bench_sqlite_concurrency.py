@@ -0,0 +1,155 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from user import rollups
+from user.checkout import checkout_cart
+from user.models import SaleItem
+from user.reports import build_report
+
+from ._bench import percentile, scratch_database, seed_catalog, seed_sales
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def lock_timer(waits):
+    """Execute wrapper recording, per transaction, the time from BEGIN until its first write went through."""
+    begun = []
+
+    def wrapper(execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            statement = sql.lstrip().upper()
+            if statement.startswith('BEGIN'):
+                begun[:] = [start]
+            elif begun and statement.startswith(WRITE_STATEMENTS):
+                waits.append((time.perf_counter() - begun.pop()) * 1000)
+    return wrapper
+
+
+def report_read():
+    """What a manager on the reports page asks for, plus a full scan of the sale items."""
+    today = timezone.localdate()
+    build_report(today - timedelta(days=29), today)
+    SaleItem.objects.aggregate(units=Sum('quantity'), revenue=Sum(F('quantity') * F('unit_price')))
+
+
+class Command(BaseCommand):
+    help = ('Run concurrent checkout writers against reporting readers on a scratch database, '
+            'with the configured SQLite pragmas and without them, and report throughput and '
+            'lock-wait percentiles.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help='Concurrent checkout threads.')
+        parser.add_argument('--readers', type=int, default=2, help='Concurrent reporting threads.')
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--sales', type=int, default=100_000, help='Sales history seeded first.')
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--basket', type=int, default=3, help='Products per checkout.')
+        parser.add_argument('--profiles', default='configured,stock',
+                            help='Comma separated: "configured" (settings pragmas) and/or "stock" (none).')
+
+    def handle(self, *args, **options):
+        profiles = [name.strip() for name in options['profiles'].split(',') if name.strip()]
+        unknown = set(profiles) - {'configured', 'stock'}
+        if unknown:
+            raise CommandError(f"Unknown profile(s): {', '.join(sorted(unknown))}.")
+
+        settings_options = connection.settings_dict['OPTIONS']
+        configured = dict(settings_options)
+        locked = {}
+        try:
+            for profile in profiles:
+                settings_options.clear()
+                if profile == 'configured':
+                    settings_options.update(configured)
+                elif 'timeout' in configured:
+                    settings_options['timeout'] = configured['timeout']
+                locked[profile] = self.run_profile(profile, options)
+        finally:
+            settings_options.clear()
+            settings_options.update(configured)
+
+        if locked.get('configured'):
+            raise CommandError(f"{locked['configured']} operation(s) failed with \"database is locked\".")
+
+    def run_profile(self, profile, options):
+        with scratch_database():
+            journal = connection.cursor().execute('PRAGMA journal_mode').fetchone()[0]
+            self.stdout.write(f'{profile} profile (journal_mode={journal}): seeding {options["sales"]:,} sales...')
+            cashier, product_ids = seed_catalog(options['products'])
+            seed_sales(options['sales'], 90, product_ids[0], len(product_ids), cashier.pk)
+            rollups.rebuild()
+            connection.close()
+
+            results = {'write': [], 'read': []}
+            lock = threading.Lock()
+            deadline = time.monotonic() + options['seconds']
+            size = options['basket']
+
+            def writer(n):
+                waits, latencies, errors = [], [], 0
+                try:
+                    with connection.execute_wrapper(lock_timer(waits)):
+                        i = n
+                        while time.monotonic() < deadline:
+                            offset = (i * size) % (len(product_ids) - size)
+                            cart = [{'id': pid, 'quantity': 1} for pid in product_ids[offset:offset + size]]
+                            i += options['writers']
+                            start = time.perf_counter()
+                            try:
+                                checkout_cart(cart, cashier=cashier)
+                            except OperationalError:
+                                errors += 1
+                                continue
+                            latencies.append((time.perf_counter() - start) * 1000)
+                finally:
+                    connection.close()
+                with lock:
+                    results['write'].append((latencies, waits, errors))
+
+            def reader():
+                latencies, errors = [], 0
+                try:
+                    while time.monotonic() < deadline:
+                        start = time.perf_counter()
+                        try:
+                            report_read()
+                        except OperationalError:
+                            errors += 1
+                            continue
+                        latencies.append((time.perf_counter() - start) * 1000)
+                finally:
+                    connection.close()
+                with lock:
+                    results['read'].append((latencies, [], errors))
+
+            threads = [threading.Thread(target=writer, args=(n,)) for n in range(options['writers'])]
+            threads += [threading.Thread(target=reader) for _ in range(options['readers'])]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.stdout.write(f"{'':>10}{'ops':>8}{'ops/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                          f"{'max ms':>9}{'locked':>8}")
+        failed = 0
+        for kind, label in (('write', 'checkouts'), ('read', 'reports'), ('wait', 'lock wait')):
+            source = results['read' if kind == 'read' else 'write']
+            samples = [ms for latencies, waits, _ in source for ms in (waits if kind == 'wait' else latencies)]
+            errors = sum(errors for _, _, errors in source) if kind != 'wait' else 0
+            failed += errors
+            rate = f"{len(samples) / options['seconds']:>9.1f}" if kind != 'wait' else f"{'':>9}"
+            self.stdout.write(
+                f'{label:>10}{len(samples):>8}{rate}'
+                + ''.join(f'{percentile(samples, pct):>9.1f}' for pct in (50, 95, 99))
+                + f"{max(samples, default=0):>9.1f}" + (f'{errors:>8}' if kind != 'wait' else '')
+            )
+        return failed
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from user.models import Sales
+
+
+class Command(BaseCommand):
+    help = 'Delete zero-total sales that never got any items (left behind by old POS page loads).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=60,
+                            help='Only purge sales older than this many minutes (default 60).')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many sales would be deleted.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(minutes=options['older_than'])
+        orphans = Sales.objects.filter(
+            total_amount=0,
+            items__isnull=True,
+            sale_date__lt=cutoff,
+        ).order_by('sales_id')
+
+        if options['dry_run']:
+            self.stdout.write(f'{orphans.count()} orphaned sale(s) would be deleted.')
+            return
+
+        # Delete in short batches so tills are never locked out for long
+        deleted = 0
+        while True:
+            batch = list(orphans.values_list('sales_id', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            with transaction.atomic():
+                Sales.objects.filter(sales_id__in=batch).delete()
+            deleted += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} orphaned sale(s).'))
@@ -0,0 +1,26 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from user import rollups
+
+
+def parse_day(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        raise CommandError(f'Invalid date {value!r}, expected YYYY-MM-DD.')
+
+
+class Command(BaseCommand):
+    help = 'Backfill or rebuild the pre-aggregated sales tables from the raw sales.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='First day to rebuild (YYYY-MM-DD).')
+        parser.add_argument('--to', dest='end', help='Last day to rebuild (YYYY-MM-DD).')
+
+    def handle(self, *args, **options):
+        start, end = parse_day(options['start']), parse_day(options['end'])
+        counts = rollups.rebuild(start, end)
+        summary = ', '.join(f'{count} {table} row(s)' for table, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {summary}.'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from user import search
+
+
+class Command(BaseCommand):
+    help = ('Recreate the product full-text search index and its triggers. '
+            'Run it after any migration that rebuilds the product table.')
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('The full-text index needs SQLite with FTS5.')
+        with transaction.atomic(), connection.cursor() as cursor:
+            search.install(cursor)
+            cursor.execute('SELECT count(*) FROM product_fts')
+            indexed = cursor.fetchone()[0]
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} product(s).'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from user import catalog
+from user.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Bring every product\'s stock_level in line with its stock in a single UPDATE.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many products are out of step.')
+
+    def handle(self, *args, **options):
+        stale = Product.objects.alias(
+            expected_level=Product.level_expression(),
+        ).exclude(stock_level=F('expected_level'))
+
+        if options['dry_run']:
+            self.stdout.write(f'{stale.count()} product(s) have a stale stock level.')
+            return
+
+        updated = stale.update(stock_level=Product.level_expression())
+        if updated:
+            catalog.invalidate()
+        self.stdout.write(self.style.SUCCESS(f'Updated the stock level of {updated} product(s).'))
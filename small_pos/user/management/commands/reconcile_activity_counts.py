@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from user import activity, archive
+
+from .rebuild_sales_rollups import parse_day
+
+
+class Command(BaseCommand):
+    help = ('Check the activity counters against the activity log and, with --fix, '
+            'recount the days that disagree.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start',
+                            help='First day to check (YYYY-MM-DD, default the oldest day still in the log).')
+        parser.add_argument('--to', dest='end', help='Last day to check (YYYY-MM-DD).')
+        parser.add_argument('--fix', action='store_true', help='Recount the days that disagree.')
+
+    def handle(self, *args, **options):
+        first_kept = timezone.localdate(archive.cutoff())
+        start, end = parse_day(options['start']), parse_day(options['end'])
+        if start is None or start < first_kept:
+            # Archived entries are no longer in the table, but stay counted
+            if start is not None:
+                self.stdout.write(self.style.WARNING(
+                    f'Entries before {first_kept} are archived; checking from {first_kept}.'
+                ))
+            start = first_kept
+        activity.flush()
+
+        actual = activity.count_rows(start, end)
+        counted = activity.counter_rows(start, end)
+        wrong = sorted(
+            (key for key in actual.keys() | counted.keys() if actual.get(key, 0) != counted.get(key, 0)),
+            key=lambda key: (key[0], key[1], key[2] or 0),
+        )
+        for day, action, user_id in wrong:
+            self.stdout.write(
+                f'{day} {action} user {user_id}: counted {counted.get((day, action, user_id), 0)}, '
+                f'logged {actual.get((day, action, user_id), 0)}'
+            )
+        if not wrong:
+            self.stdout.write(self.style.SUCCESS('Activity counters match the log.'))
+            return
+        if not options['fix']:
+            self.stdout.write(self.style.WARNING(f'{len(wrong)} counter(s) disagree; run with --fix to recount.'))
+            return
+        for day in sorted({key[0] for key in wrong}):
+            activity.rebuild_counts(day, day)
+        self.stdout.write(self.style.SUCCESS(f'Recounted {len({key[0] for key in wrong})} day(s).'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from user import analytics
+
+
+class Command(BaseCommand):
+    help = 'Append new sales to the columnar sales snapshot used for trend analysis.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Discard the snapshot and take it again from the first sale.')
+
+    def handle(self, *args, **options):
+        if not analytics.available():
+            raise CommandError('NumPy is not installed.')
+        before = analytics.load().high_water
+        snapshot = analytics.rebuild() if options['rebuild'] else analytics.refresh()
+        self.stdout.write(self.style.SUCCESS(
+            f'Snapshot holds {len(snapshot):,} sale(s) in {len(snapshot.segments)} segment(s) '
+            f'(up to sale {snapshot.high_water}, was {before}).'
+        ))
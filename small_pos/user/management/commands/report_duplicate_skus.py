@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from user.models import Product
+from user.scan import duplicate_skus
+
+
+class Command(BaseCommand):
+    help = 'List products sharing a non-blank SKU (these block the unique SKU migration).'
+
+    def handle(self, *args, **options):
+        duplicates = duplicate_skus()
+        if not duplicates:
+            self.stdout.write(self.style.SUCCESS('No duplicate SKUs.'))
+            return
+
+        names = dict(Product.objects.filter(
+            id__in=[pid for ids in duplicates.values() for pid in ids]
+        ).values_list('id', 'name'))
+        for sku, ids in duplicates.items():
+            self.stdout.write(f'{sku}:')
+            for product_id in ids:
+                self.stdout.write(f'    #{product_id} {names[product_id]}')
+        self.stdout.write(self.style.WARNING(f'{len(duplicates)} SKU(s) are used more than once.'))
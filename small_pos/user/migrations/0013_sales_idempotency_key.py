@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0012_alter_activitylog_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sales',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:30
+
+from django.db import migrations
+
+# Frozen copy of the index as first shipped; later changes to user.search
+# get their own migration.
+SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+        name, description, sku, category_name,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_insert AFTER INSERT ON product BEGIN
+        INSERT INTO product_fts (rowid, name, description, sku, category_name)
+        VALUES (new.id, new.name, new.description, new.sku,
+                (SELECT name FROM category WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_update
+    AFTER UPDATE OF name, description, sku, category_id ON product BEGIN
+        DELETE FROM product_fts WHERE rowid = old.id;
+        INSERT INTO product_fts (rowid, name, description, sku, category_name)
+        VALUES (new.id, new.name, new.description, new.sku,
+                (SELECT name FROM category WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_delete AFTER DELETE ON product BEGIN
+        DELETE FROM product_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_category_update
+    AFTER UPDATE OF name ON category BEGIN
+        UPDATE product_fts SET category_name = new.name
+        WHERE rowid IN (SELECT id FROM product WHERE category_id = new.id);
+    END
+    """,
+]
+
+DROP = [
+    'DROP TRIGGER IF EXISTS product_fts_insert',
+    'DROP TRIGGER IF EXISTS product_fts_update',
+    'DROP TRIGGER IF EXISTS product_fts_delete',
+    'DROP TRIGGER IF EXISTS product_fts_category_update',
+    'DROP TABLE IF EXISTS product_fts',
+]
+
+POPULATE = """
+    INSERT INTO product_fts (rowid, name, description, sku, category_name)
+    SELECT product.id, product.name, product.description, product.sku, category.name
+    FROM product JOIN category ON category.id = product.category_id
+"""
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for statement in DROP + SCHEMA:
+            cursor.execute(statement)
+        cursor.execute(POPULATE)
+        cursor.execute("INSERT INTO product_fts (product_fts) VALUES ('optimize')")
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for statement in DROP:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0013_sales_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:45
+
+from django.db import migrations, models
+
+
+def check_duplicate_skus(apps, schema_editor):
+    Product = apps.get_model('user', 'Product')
+    repeated = (
+        Product.objects.exclude(sku='')
+        .values('sku').annotate(uses=models.Count('id')).filter(uses__gt=1)
+        .values_list('sku', flat=True)
+    )
+    duplicates = {}
+    for sku, product_id in (Product.objects.filter(sku__in=repeated)
+                            .order_by('sku', 'id').values_list('sku', 'id')):
+        duplicates.setdefault(sku, []).append(product_id)
+    if duplicates:
+        listing = '; '.join(
+            f'{sku!r}: products {", ".join(map(str, ids))}' for sku, ids in duplicates.items()
+        )
+        raise RuntimeError(
+            'Cannot make product SKUs unique while duplicates exist. Fix these '
+            f'(see `manage.py report_duplicate_skus`) and migrate again: {listing}'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0014_product_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_skus, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(condition=models.Q(('sku', ''), _negated=True), fields=('sku',), name='product_sku_unique'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Exists, OuterRef, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def backfill(apps, schema_editor):
+    """Fill the new table from the sales already recorded, in one INSERT ... SELECT."""
+    Sales = apps.get_model('user', 'Sales')
+    SaleItem = apps.get_model('user', 'SaleItem')
+    DailySalesSummary = apps.get_model('user', 'DailySalesSummary')
+    money = models.DecimalField()
+    rows = (
+        Sales.objects.filter(Exists(SaleItem.objects.filter(sale=OuterRef('pk'))))
+        .annotate(day=TruncDate('sale_date'))
+        .values('day', 'cashier_id', 'payment_method')
+        .annotate(
+            total_count=Count('sales_id'),
+            total_gross=Coalesce(Sum('total_amount'), 0, output_field=money),
+            total_paid=Coalesce(Sum('amount_paid'), 0, output_field=money),
+        )
+        .order_by()
+    )
+    sql, params = rows.query.sql_with_params()
+    qn = schema_editor.connection.ops.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {qn(DailySalesSummary._meta.db_table)} '
+            '(day, cashier_id, payment_method, sales_count, gross_total, amount_paid) '
+            'SELECT rows.day, rows.cashier_id, rows.payment_method, rows.total_count, '
+            f'rows.total_gross, rows.total_paid FROM ({sql}) rows',
+            params,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0015_product_sku_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('payment_method', models.CharField(choices=[('cash', 'Cash'), ('mtn', 'MTN Mobile Money'), ('airtel', 'AirtelTigo Money'), ('vodafone', 'Vodafone Cash'), ('card', 'Card')], max_length=20)),
+                ('sales_count', models.IntegerField(default=0)),
+                ('gross_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('amount_paid', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cashier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily sales summaries',
+                'db_table': 'daily_sales_summary',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalessummary',
+            constraint=models.UniqueConstraint(fields=('day', 'cashier', 'payment_method'), name='daily_sales_summary_key'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
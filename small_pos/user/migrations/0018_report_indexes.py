@@ -0,0 +1,35 @@
+# Generated by Django 4.2.11 on 2026-10-18 11:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0017_productdailysales'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='productdailysales',
+            name='product_daily_sales_key',
+        ),
+        migrations.AlterField(
+            model_name='productdailysales',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='user.product'),
+        ),
+        migrations.AddIndex(
+            model_name='productdailysales',
+            index=models.Index(fields=['product', 'day', 'quantity', 'revenue', 'cost', 'costed_revenue'], name='product_daily_sales_cover'),
+        ),
+        migrations.AddIndex(
+            model_name='sales',
+            index=models.Index(fields=['sale_date'], name='sales_sale_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='productdailysales',
+            constraint=models.UniqueConstraint(fields=('product', 'day'), name='product_daily_sales_key'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.11 on 2026-10-18 12:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0019_reportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlySalesSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('payment_method', models.CharField(choices=[('cash', 'Cash'), ('mtn', 'MTN Mobile Money'), ('airtel', 'AirtelTigo Money'), ('vodafone', 'Vodafone Cash'), ('card', 'Card')], max_length=20)),
+                ('sales_count', models.IntegerField(default=0)),
+                ('gross_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cashier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Hourly sales summaries',
+                'db_table': 'hourly_sales_summary',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='hourlysalessummary',
+            constraint=models.UniqueConstraint(fields=('day', 'hour', 'cashier', 'payment_method'), name='hourly_sales_summary_key'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.11 on 2026-10-18 14:10
+
+from django.db import migrations, models
+from django.db.models.functions import Cast, Substr
+import django.db.models.deletion
+
+# Labels written to related_object so far, e.g. "Product ID: 42"
+MODELS = {'Product': 'product', 'Category': 'category', 'User': 'user', 'Sale': 'sales'}
+
+
+def parse_references(apps, schema_editor):
+    ActivityLog = apps.get_model('user', 'ActivityLog')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    for label, model in MODELS.items():
+        prefix = f'{label} ID: '
+        content_type, _ = ContentType.objects.get_or_create(app_label='user', model=model)
+        # One UPDATE per label, the id cut out of the string in the database
+        ActivityLog.objects.filter(related_object__regex=rf'^{prefix}[0-9]+$').update(
+            content_type=content_type,
+            object_id=Cast(Substr('related_object', len(prefix) + 1), models.BigIntegerField()),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('user', '0022_activitylog_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activitylog',
+            name='content_type',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='contenttypes.contenttype'),
+        ),
+        migrations.AddField(
+            model_name='activitylog',
+            name='object_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['content_type', 'object_id', 'timestamp'], name='activity_log_object_idx'),
+        ),
+        migrations.RunPython(parse_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.11 on 2026-10-18 14:40
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def count_existing(apps, schema_editor):
+    ActivityLog = apps.get_model('user', 'ActivityLog')
+    ActivityDailyCount = apps.get_model('user', 'ActivityDailyCount')
+    rows = (
+        ActivityLog.objects.annotate(day=TruncDate('timestamp'))
+        .values_list('day', 'action', 'user_id').annotate(total=models.Count('id')).order_by()
+    )
+    ActivityDailyCount.objects.bulk_create([
+        ActivityDailyCount(day=day, action=action, user_id=user_id, count=total)
+        for day, action, user_id, total in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0023_activitylog_object_refs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityDailyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('action', models.CharField(choices=[('sale', 'Sale Made'), ('product_add', 'Product Added'), ('product_update', 'Product Updated'), ('product_delete', 'Product Deleted'), ('stock_update', 'Stock Updated'), ('user_login', 'User Login'), ('user_logout', 'User Logout'), ('user_register', 'User Registered'), ('category_add', 'Category Added'), ('category_update', 'Category Updated'), ('category_delete', 'Category Deleted')], max_length=50)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'activity_daily_count',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='activitydailycount',
+            constraint=models.UniqueConstraint(fields=('day', 'action', 'user'), name='activity_daily_count_key'),
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.11 on 2026-10-18 16:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0024_activitydailycount'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sales',
+            name='sale_date',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
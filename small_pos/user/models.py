@@ -1,5 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.lookups import LessThan, LessThanOrEqual
+from django.utils import timezone
 
 import user
 
@@ -42,6 +46,9 @@ class Category(models.Model):
     class Meta:
         db_table = 'category'
         verbose_name_plural = 'Categories'
+        indexes = [
+            models.Index(fields=['name'], name='category_name_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -65,10 +72,45 @@ class Product(models.Model):
 
     class Meta:
         db_table = 'product'
+        constraints = [
+            # Scanners look products up by exact SKU; blank SKUs are allowed to repeat
+            models.UniqueConstraint(fields=['sku'], condition=~models.Q(sku=''), name='product_sku_unique'),
+        ]
+        indexes = [
+            # Inventory pages are sorted by name, optionally for one stock level
+            models.Index(fields=['name'], name='product_name_idx'),
+            models.Index(fields=['stock_level', 'name'], name='product_level_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def level_for(stock, min_stock):
+        """Stock level label for the given stock and minimum stock"""
+        if stock <= 0:
+            return 'Out of Stock'
+        if stock < min_stock:
+            return 'Low Stock'
+        return 'In Stock'
+
+    @staticmethod
+    def level_expression(stock=models.F('stock')):
+        """Database expression computing the stock level for ``stock``"""
+        return models.Case(
+            models.When(LessThanOrEqual(stock, 0), then=models.Value('Out of Stock')),
+            models.When(LessThan(stock, models.F('min_stock')), then=models.Value('Low Stock')),
+            default=models.Value('In Stock'),
+        )
+
+    def save(self, *args, **kwargs):
+        # Keep the stock level in step with every stock change
+        self.stock_level = self.level_for(int(self.stock), int(self.min_stock))
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'stock' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'stock_level'}
+        super().save(*args, **kwargs)
+
 
 class Sales(models.Model):
     sales_id = models.AutoField(primary_key=True)
@@ -93,13 +135,21 @@ class Sales(models.Model):
     amount_paid = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     payment_method = models.CharField(max_length=20, choices=PAYMENT_CHOICES, default='cash')
     receipt_method = models.CharField(max_length=20, choices=RECEIPT_CHOICES, default='none')
-    sale_date = models.DateTimeField(auto_now_add=True)
-    cashier = models.ForeignKey(User, on_delete=models.PROTECT, blank=True, null=True, default=None)
+    # Set explicitly for sales captured on an offline terminal
+    sale_date = models.DateTimeField(default=timezone.now, editable=False)
+    # Indexed together with the sale date below
+    cashier = models.ForeignKey(User, on_delete=models.PROTECT, blank=True, null=True, default=None, db_index=False)
+    # Client supplied key so a resubmitted checkout returns the original sale
+    idempotency_key = models.CharField(max_length=64, unique=True, blank=True, null=True, editable=False)
    
 
     class Meta:
         db_table = 'sales'
         verbose_name_plural = 'Sales'
+        indexes = [
+            models.Index(fields=['sale_date'], name='sales_sale_date_idx'),
+            models.Index(fields=['cashier', 'sale_date'], name='sales_cashier_date_idx'),
+        ]
 
     @property
     def subtotal(self):
@@ -137,6 +187,7 @@ class SaleItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     quantity = models.IntegerField()
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
 
     class Meta:
         db_table = 'sale_item'
@@ -163,18 +214,122 @@ class Receipt(models.Model):
 
     class Meta:
         db_table = 'receipt'
+        indexes = [
+            models.Index(fields=['issued_at'], name='receipt_issued_at_idx'),
+        ]
 
 
     
     def __str__(self):
         return f"Receipt {self.receipt_number} for Sale {self.sale.sales_id}"
     
+    @staticmethod
+    def number_for(sale_id):
+        return f"REC-{sale_id:06d}"
+
     def save(self, *args, **kwargs):
         if not self.receipt_number:
-            self.receipt_number = f"REC-{self.sale.sales_id:06d}"
+            self.receipt_number = self.number_for(self.sale.sales_id)
         super().save(*args, **kwargs)
 
 
+class DailySalesSummary(models.Model):
+    """Per day, cashier and payment method sales totals, kept up to date at checkout"""
+    day = models.DateField()
+    cashier = models.ForeignKey(User, on_delete=models.PROTECT, blank=True, null=True)
+    payment_method = models.CharField(max_length=20, choices=Sales.PAYMENT_CHOICES)
+    sales_count = models.IntegerField(default=0)
+    gross_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    amount_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'daily_sales_summary'
+        verbose_name_plural = 'Daily sales summaries'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'cashier', 'payment_method'], name='daily_sales_summary_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.payment_method} - {self.sales_count} sales"
+
+
+class HourlySalesSummary(models.Model):
+    """Per local hour, cashier and payment method sales totals, kept up to date at checkout"""
+    day = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    cashier = models.ForeignKey(User, on_delete=models.PROTECT, blank=True, null=True)
+    payment_method = models.CharField(max_length=20, choices=Sales.PAYMENT_CHOICES)
+    sales_count = models.IntegerField(default=0)
+    gross_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'hourly_sales_summary'
+        verbose_name_plural = 'Hourly sales summaries'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'hour', 'cashier', 'payment_method'], name='hourly_sales_summary_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.hour:02d}:00 {self.payment_method} - {self.sales_count} sales"
+
+
+class ProductDailySales(models.Model):
+    """Per day and product quantity, revenue and cost, kept up to date at checkout"""
+    day = models.DateField()
+    # Indexed by the constraints below, which lead with the product
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, db_index=False)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Cost and the revenue it applies to only cover items whose cost price was known
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    costed_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'product_daily_sales'
+        verbose_name_plural = 'Product daily sales'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='product_daily_sales_key'),
+        ]
+        indexes = [
+            # Covers report queries, which read every column grouped by product
+            models.Index(
+                fields=['product', 'day', 'quantity', 'revenue', 'cost', 'costed_revenue'],
+                name='product_daily_sales_cover',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.product_id} - {self.quantity} sold"
+
+
+class ReportJob(models.Model):
+    """A report computed in the background, stored under its parameters and data version"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    key = models.CharField(max_length=64, unique=True)
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    result = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'report_job'
+
+    def __str__(self):
+        return f"Report {self.key[:8]} ({self.status})"
+
+
 class ActivityLog(models.Model):
     ACTION_CHOICES = [
         ('sale', 'Sale Made'),
@@ -190,21 +345,48 @@ class ActivityLog(models.Model):
         ('category_delete', 'Category Deleted'),
     ]
     
-    user = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True)
+    # Indexed together with the timestamp below
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, db_index=False)
     action = models.CharField(max_length=50, choices=ACTION_CHOICES)
     description = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the entry is logged, which can be a moment before it is written
+    timestamp = models.DateTimeField(default=timezone.now)
     ip_address = models.GenericIPAddressField(blank=True, null=True)
     related_object = models.CharField(max_length=200, blank=True)
+    # The object the entry is about, indexed for per-object history
+    content_type = models.ForeignKey(
+        ContentType, on_delete=models.SET_NULL, blank=True, null=True, db_index=False,
+    )
+    object_id = models.PositiveBigIntegerField(blank=True, null=True)
     
     class Meta:
         db_table = 'activity_log'
         verbose_name = 'Activity Log'
         verbose_name_plural = 'Activity Logs'
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp'], name='activity_log_timestamp_idx'),
+            models.Index(fields=['action', 'timestamp'], name='activity_log_action_idx'),
+            models.Index(fields=['user', 'timestamp'], name='activity_log_user_idx'),
+            models.Index(fields=['content_type', 'object_id', 'timestamp'], name='activity_log_object_idx'),
+        ]
     
     def __str__(self):
         return f"{self.get_action_display()} - {self.timestamp}"
 
 
+class ActivityDailyCount(models.Model):
+    """Activity log entries per local day, action and user, kept up to date as entries are written"""
+    day = models.DateField()
+    action = models.CharField(max_length=50, choices=ActivityLog.ACTION_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'activity_daily_count'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'action', 'user'], name='activity_daily_count_key'),
+        ]
 
+    def __str__(self):
+        return f"{self.day} {self.action} - {self.count}"
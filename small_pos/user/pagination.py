@@ -0,0 +1,121 @@
+"""Keyset (cursor) pagination for the newest-first history pages.
+
+Instead of ``OFFSET``, each page asks for the rows that come after (or
+before) the last row already shown, on ``(time, id)``:
+
+    WHERE time <= :time AND NOT (time = :time AND id >= :id)
+    ORDER BY time DESC, id DESC LIMIT :size + 1
+
+which SQLite answers by walking the time index (every SQLite index ends
+with the rowid, so an index on ``time`` is already ordered on
+``(time, id)``), so the thousandth page costs the same as the first.
+Cursors are opaque strings for the ``after``/``before`` query parameters.
+
+Totals shown next to the pages are counted once and cached for
+``COUNT_CACHE_TIMEOUT`` seconds instead of on every page view.
+"""
+import base64
+import hashlib
+import json
+from collections import deque
+from datetime import datetime
+from itertools import dropwhile, islice, takewhile
+
+from django.core.cache import cache
+from django.db.models import Q, QuerySet
+
+COUNT_CACHE_TIMEOUT = 60
+
+
+def encode_cursor(time, pk):
+    raw = json.dumps([time.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """``(time, pk)`` from a cursor, or ``None`` if it is missing or malformed."""
+    if not value:
+        return None
+    try:
+        time, pk = json.loads(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)))
+        return datetime.fromisoformat(time), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+class CursorPage:
+    """One page of rows, newest first, with cursors to its neighbours."""
+
+    def __init__(self, items, time_field, has_next, has_previous):
+        self.items = items
+        self.time_field = time_field
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _cursor(self, item):
+        return encode_cursor(getattr(item, self.time_field), item.pk)
+
+    @property
+    def next_cursor(self):
+        return self._cursor(self.items[-1]) if self.has_next else ''
+
+    @property
+    def previous_cursor(self):
+        return self._cursor(self.items[0]) if self.has_previous else ''
+
+
+def paginate(rows, time_field, after=None, before=None, size=20):
+    """The page of ``rows`` following the ``after`` cursor, or preceding ``before``.
+
+    ``rows`` is a queryset, or any iterable already sorted newest first (such
+    as archived entries), which is only read as far as the page needs. The
+    cursors are raw ``after``/``before`` values.
+    """
+    after, before = decode_cursor(after), decode_cursor(before)
+    if not isinstance(rows, QuerySet):
+        def key(item):
+            return getattr(item, time_field), item.pk
+        if before:
+            newer = deque(takewhile(lambda item: key(item) > before, rows), maxlen=size + 1)
+            items = list(newer)[-size:]
+            return CursorPage(items, time_field, True, len(newer) > size)
+        if after:
+            rows = dropwhile(lambda item: key(item) >= after, rows)
+        items = list(islice(rows, size + 1))
+        return CursorPage(items[:size], time_field, len(items) > size, after is not None)
+
+    if before:
+        time, pk = before
+        newer = list(
+            rows.filter(Q(**{f'{time_field}__gte': time}) & ~Q(**{time_field: time, 'pk__lte': pk}))
+            .order_by(time_field, 'pk')[:size + 1]
+        )
+        return CursorPage(newer[:size][::-1], time_field, True, len(newer) > size)
+    if after:
+        time, pk = after
+        rows = rows.filter(Q(**{f'{time_field}__lte': time}) & ~Q(**{time_field: time, 'pk__gte': pk}))
+    items = list(rows.order_by(f'-{time_field}', '-pk')[:size + 1])
+    return CursorPage(items[:size], time_field, len(items) > size, after is not None)
+
+
+def cached_count(queryset, timeout=COUNT_CACHE_TIMEOUT):
+    """``queryset.count()``, reused for ``timeout`` seconds."""
+    key = 'count:' + hashlib.sha1(str(queryset.query).encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
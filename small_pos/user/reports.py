@@ -0,0 +1,186 @@
+"""Sales report computation and background report jobs.
+
+``build_report`` computes everything the reports page shows for a date
+range. The page does not call it directly: it submits a ``ReportJob``,
+which runs on a small in-process thread pool and keeps its result in the
+database under a key made of the parameters and a data version (the sale
+count and gross total of the range, so any sale or rollup rebuild in the
+range gives a new key). Reloading the page, or several users asking for
+the same report at once, reuses the same job instead of computing it
+again. Nothing beyond the database is needed.
+"""
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, close_old_connections, connection
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from user import analytics, rollups
+from user.models import DailySalesSummary, ReportJob, Sales, SaleItem
+
+REPORT_WORKERS = 2
+# Seconds the page waits for a job before showing the "preparing" notice
+REPORT_WAIT = 2
+# A job left running this long (e.g. by a restarted process) is run again
+REPORT_JOB_TIMEOUT = 300
+# Finished jobs older than this are deleted
+REPORT_JOB_MAX_AGE = timedelta(days=1)
+
+_lock = threading.Lock()
+_executor = None
+_running = {}
+
+
+def build_report(start=None, end=None):
+    """Everything the reports page shows for the local days ``start`` to ``end``."""
+    # Summary Statistics, from the daily rollups
+    totals = rollups.sales_totals(start, end)
+
+    # Top selling products, category breakdown and gross margins
+    product_totals = rollups.product_totals(start, end)
+    top_products = rollups.top_products(product_totals)
+    category_data = rollups.category_sales(product_totals)
+
+    # Monthly Sales over the chosen range (last 6 months by default)
+    month_start = start or (timezone.localdate() - timedelta(days=180)).replace(day=1)
+    if getattr(settings, 'REPORTS_USE_ANALYTICS', False) and analytics.available():
+        monthly_sales = analytics.refresh().monthly_totals(month_start, end)
+    else:
+        monthly_sales = DailySalesSummary.objects.filter(
+            day__gte=month_start, **({'day__lte': end} if end else {})
+        ).annotate(
+            month=TruncMonth('day')
+        ).values_list('month').annotate(
+            total=Sum('gross_total')
+        ).order_by('month')
+
+    # Recent Transactions in the range, newest first off the sale_date index
+    recent_sales = Sales.objects.filter(receipt__isnull=False)
+    if start:
+        recent_sales = recent_sales.filter(sale_date__gte=rollups.day_bounds(start, start)[0])
+    if end:
+        recent_sales = recent_sales.filter(sale_date__lt=rollups.day_bounds(end, end)[1])
+    item_counts = SaleItem.objects.filter(sale=OuterRef('pk')).order_by().values('sale').annotate(
+        count=Count('id')
+    ).values('count')
+    recent_sales = recent_sales.select_related('receipt', 'cashier').annotate(
+        items_count=Subquery(item_counts)
+    ).order_by('-sale_date')[:10]
+
+    return {
+        'total_sales': totals['gross'],
+        'total_transactions': totals['count'],
+        'top_product_name': top_products[0]['product__name'] if top_products else 'N/A',
+        'top_products': top_products,
+        'category_labels': [item['product__category__name'] for item in category_data],
+        'category_values': [item['total_quantity'] for item in category_data],
+        'category_margins': category_data,
+        'margins': rollups.margin_totals(category_data),
+        'month_labels': [month.strftime('%b %Y') for month, _ in monthly_sales],
+        'month_values': [float(total) for _, total in monthly_sales],
+        'transactions': [
+            {
+                'receipt_no': sale.receipt.receipt_number,
+                'date': timezone.localtime(sale.sale_date).strftime('%Y-%m-%d'),
+                'items_count': sale.items_count or 0,
+                'total': sale.total_amount,
+                'staff': sale.cashier_name,
+            }
+            for sale in recent_sales
+        ],
+    }
+
+
+def job_key(start=None, end=None):
+    """Key for a report over ``start``-``end`` against the data as it is now."""
+    totals = rollups.sales_totals(start, end)
+    material = {
+        'from': start, 'to': end,
+        # The default chart window moves with the date
+        'today': timezone.localdate(),
+        'count': totals['count'], 'gross': totals['gross'],
+    }
+    return hashlib.sha256(json.dumps(material, cls=DjangoJSONEncoder, sort_keys=True).encode()).hexdigest()
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix='report')
+    return _executor
+
+
+def _run(job_id, start, end):
+    close_old_connections()
+    try:
+        ReportJob.objects.filter(pk=job_id).update(status='running', started_at=timezone.now())
+        try:
+            result = build_report(start, end)
+        except Exception as e:
+            ReportJob.objects.filter(pk=job_id).update(
+                status='failed', error=repr(e), finished_at=timezone.now(),
+            )
+            return
+        # Round-trip through JSON so the page sees the same values whether
+        # the job ran in this process or another one
+        result = json.loads(json.dumps(result, cls=DjangoJSONEncoder))
+        ReportJob.objects.filter(pk=job_id).update(
+            status='done', result=result, finished_at=timezone.now(),
+        )
+    finally:
+        connection.close()
+
+
+def _is_stale(job):
+    started = job.started_at or job.created_at
+    return timezone.now() - started > timedelta(seconds=REPORT_JOB_TIMEOUT)
+
+
+def submit_report(start=None, end=None, user=None):
+    """Return the job for this report, starting it unless it is done or already under way."""
+    key = job_key(start, end)
+    job = ReportJob.objects.filter(key=key).first()
+    if job is not None and job.status == 'done':
+        return job
+
+    with _lock:
+        if key in _running:
+            return job or ReportJob.objects.get(key=key)
+        if job is None:
+            try:
+                job = ReportJob.objects.create(
+                    key=key, requested_by=user,
+                    params={'from_date': start and start.isoformat(), 'to_date': end and end.isoformat()},
+                )
+            except IntegrityError:
+                # Another process created it first and is running it
+                return ReportJob.objects.get(key=key)
+        elif job.status in ('pending', 'running') and not _is_stale(job):
+            return job
+        else:
+            ReportJob.objects.filter(pk=job.pk).update(status='pending', error='', started_at=None)
+            job.status = 'pending'
+
+        future = _pool().submit(_run, job.pk, start, end)
+        _running[key] = future
+        future.add_done_callback(lambda _: _running.pop(key, None))
+
+    # Results keyed on an older data version are never read again
+    ReportJob.objects.filter(finished_at__lt=timezone.now() - REPORT_JOB_MAX_AGE).delete()
+    return job
+
+
+def wait_for(job, timeout=REPORT_WAIT):
+    """Give a job started by this process up to ``timeout`` seconds, then return it fresh."""
+    future = _running.get(job.key)
+    if future is not None:
+        wait([future], timeout=timeout)
+    job.refresh_from_db()
+    return job
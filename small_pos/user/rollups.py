@@ -0,0 +1,338 @@
+"""Pre-aggregated sales tables.
+
+Checkout adds every committed sale to the rollups in the same transaction,
+so dashboards and reports read one small row per day (``DailySalesSummary``),
+per hour (``HourlySalesSummary``) or per product and day (``ProductDailySales``)
+instead of scanning ``Sales`` and ``SaleItem``. ``rebuild`` recomputes them from the raw tables for any
+range of days (run ``manage.py rebuild_sales_rollups`` after deploying, or
+whenever sales are edited by hand).
+"""
+import heapq
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from operator import itemgetter
+
+from django.db import connection, transaction
+from django.db.models import Case, Count, DecimalField, Exists, F, OuterRef, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, ExtractHour, ExtractIsoWeekDay, TruncDate
+from django.utils import timezone
+
+from user.catalog import get_catalog
+from user.models import DailySalesSummary, HourlySalesSummary, ProductDailySales, Sales, SaleItem
+
+ZERO = Decimal('0.00')
+
+
+def day_bounds(start, end):
+    """Aware datetimes covering the local days ``start`` to ``end`` inclusive."""
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(start, time.min), tz),
+        timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz),
+    )
+
+
+def _upsert(model, key, increments):
+    """Add ``increments`` to the row identified by ``key``, creating it if needed.
+
+    Runs inside the checkout transaction, which already holds SQLite's write
+    lock, so the update-then-insert cannot race another checkout.
+    """
+    updated = model.objects.filter(**key).update(
+        **{field: F(field) + value for field, value in increments.items()}
+    )
+    if not updated:
+        model.objects.create(**key, **increments)
+
+
+def _upsert_many(model, key_fields, rows, batch_size=100):
+    """Add each of ``rows`` onto the row with the same key, a batch per statement.
+
+    Uses ``INSERT ... ON CONFLICT DO UPDATE``, which SQLite and PostgreSQL
+    both understand, so a basket of many products costs one round trip. Key
+    fields must not be nullable (NULLs never conflict).
+    """
+    if not rows:
+        return
+    opts = model._meta
+    qn = connection.ops.quote_name
+    fields = [opts.get_field(name) for name in rows[0]]
+    columns = ', '.join(qn(field.column) for field in fields)
+    keys = ', '.join(qn(opts.get_field(name).column) for name in key_fields)
+    updates = ', '.join(
+        f'{qn(field.column)} = {qn(opts.db_table)}.{qn(field.column)} + excluded.{qn(field.column)}'
+        for field in fields if field.attname not in key_fields
+    )
+    row_placeholder = '(%s)' % ', '.join(['%s'] * len(fields))
+
+    with connection.cursor() as cursor:
+        for offset in range(0, len(rows), batch_size):
+            batch = rows[offset:offset + batch_size]
+            cursor.execute(
+                f'INSERT INTO {qn(opts.db_table)} ({columns}) '
+                f'VALUES {", ".join([row_placeholder] * len(batch))} '
+                f'ON CONFLICT ({keys}) DO UPDATE SET {updates}',
+                [field.get_db_prep_save(row[field.attname], connection) for row in batch for field in fields],
+            )
+
+
+def record_sales(sales, items=()):
+    """Add freshly committed ``sales`` and their ``items`` to the rollups."""
+    groups = {}
+    hours = {}
+    for sale in sales:
+        local = timezone.localtime(sale.sale_date)
+        key = (local.date(), sale.cashier_id, sale.payment_method)
+        count, gross, paid = groups.get(key, (0, ZERO, ZERO))
+        groups[key] = (count + 1, gross + sale.total_amount, paid + (sale.amount_paid or 0))
+        key = (local.date(), local.hour, sale.cashier_id, sale.payment_method)
+        count, gross = hours.get(key, (0, ZERO))
+        hours[key] = (count + 1, gross + sale.total_amount)
+
+    for (day, cashier_id, payment_method), (count, gross, paid) in groups.items():
+        _upsert(
+            DailySalesSummary,
+            {'day': day, 'cashier_id': cashier_id, 'payment_method': payment_method},
+            {'sales_count': count, 'gross_total': gross, 'amount_paid': paid},
+        )
+    for (day, hour, cashier_id, payment_method), (count, gross) in hours.items():
+        _upsert(
+            HourlySalesSummary,
+            {'day': day, 'hour': hour, 'cashier_id': cashier_id, 'payment_method': payment_method},
+            {'sales_count': count, 'gross_total': gross},
+        )
+
+    products = {}
+    for item in items:
+        key = (timezone.localdate(item.sale.sale_date), item.product_id)
+        row = products.setdefault(key, {'quantity': 0, 'revenue': ZERO, 'cost': ZERO, 'costed_revenue': ZERO})
+        revenue = item.quantity * item.unit_price
+        row['quantity'] += item.quantity
+        row['revenue'] += revenue
+        if item.unit_cost is not None:
+            row['cost'] += item.quantity * item.unit_cost
+            row['costed_revenue'] += revenue
+
+    _upsert_many(ProductDailySales, ['product_id', 'day'], [
+        {'day': day, 'product_id': product_id, **totals}
+        for (day, product_id), totals in products.items()
+    ])
+
+
+def _day_filter(start, end):
+    filters = {}
+    if start:
+        filters['day__gte'] = start
+    if end:
+        filters['day__lte'] = end
+    return filters
+
+
+def completed_sales():
+    """Sales that actually sold something (skips rows left by abandoned POS pages)."""
+    return Sales.objects.filter(Exists(SaleItem.objects.filter(sale=OuterRef('pk'))))
+
+
+def _insert_from(model, rows, columns):
+    """Insert the rows of a ``values()`` queryset into ``model``'s table with one INSERT ... SELECT.
+
+    ``columns`` maps each model field to the queryset column that fills it.
+    The rows never leave the database, so rebuilding years of history does
+    not build a model instance per row.
+    """
+    opts = model._meta
+    qn = connection.ops.quote_name
+    sql, params = rows.query.sql_with_params()
+    targets = ', '.join(qn(opts.get_field(field).column) for field in columns)
+    sources = ', '.join(f'rows.{qn(column)}' for column in columns.values())
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {qn(opts.db_table)} ({targets}) SELECT {sources} FROM ({sql}) rows', params)
+
+
+def rebuild(start=None, end=None):
+    """Recompute the rollups for the local days ``start`` to ``end`` (all history by default).
+
+    Sale items recorded before their cost was captured are costed at the
+    product's current cost price.
+    """
+    sales = completed_sales()
+    items = SaleItem.objects.all()
+    if start:
+        sales = sales.filter(sale_date__gte=day_bounds(start, start)[0])
+        items = items.filter(sale__sale_date__gte=day_bounds(start, start)[0])
+    if end:
+        sales = sales.filter(sale_date__lt=day_bounds(end, end)[1])
+        items = items.filter(sale__sale_date__lt=day_bounds(end, end)[1])
+    summaries = DailySalesSummary.objects.filter(**_day_filter(start, end))
+    hourly = HourlySalesSummary.objects.filter(**_day_filter(start, end))
+    product_sales = ProductDailySales.objects.filter(**_day_filter(start, end))
+
+    money = DecimalField()
+    rows = (
+        sales.annotate(day=TruncDate('sale_date'))
+        .values('day', 'cashier_id', 'payment_method')
+        .annotate(
+            total_count=Count('sales_id'),
+            total_gross=Coalesce(Sum('total_amount'), 0, output_field=money),
+            total_paid=Coalesce(Sum('amount_paid'), 0, output_field=money),
+        )
+        .order_by()
+    )
+    hour_rows = (
+        sales.annotate(day=TruncDate('sale_date'), hour=ExtractHour('sale_date'))
+        .values('day', 'hour', 'cashier_id', 'payment_method')
+        .annotate(
+            total_count=Count('sales_id'),
+            total_gross=Coalesce(Sum('total_amount'), 0, output_field=money),
+        )
+        .order_by()
+    )
+    line_total = F('quantity') * F('unit_price')
+    unit_cost = Coalesce('unit_cost', 'product__cost_price')
+    product_rows = (
+        items.annotate(day=TruncDate('sale__sale_date'))
+        .values('day', 'product_id')
+        .annotate(
+            total_quantity=Sum('quantity'),
+            total_revenue=Coalesce(Sum(line_total), 0, output_field=money),
+            total_cost=Coalesce(Sum(F('quantity') * unit_cost), 0, output_field=money),
+            total_costed_revenue=Sum(Case(
+                When(Q(unit_cost__isnull=False) | Q(product__cost_price__isnull=False), then=line_total),
+                default=Value(0),
+                output_field=money,
+            )),
+        )
+        .order_by()
+    )
+    with transaction.atomic():
+        summaries.delete()
+        hourly.delete()
+        product_sales.delete()
+        _insert_from(DailySalesSummary, rows, {
+            'day': 'day', 'cashier_id': 'cashier_id', 'payment_method': 'payment_method',
+            'sales_count': 'total_count', 'gross_total': 'total_gross', 'amount_paid': 'total_paid',
+        })
+        _insert_from(HourlySalesSummary, hour_rows, {
+            'day': 'day', 'hour': 'hour', 'cashier_id': 'cashier_id', 'payment_method': 'payment_method',
+            'sales_count': 'total_count', 'gross_total': 'total_gross',
+        })
+        _insert_from(ProductDailySales, product_rows, {
+            'day': 'day', 'product_id': 'product_id', 'quantity': 'total_quantity',
+            'revenue': 'total_revenue', 'cost': 'total_cost', 'costed_revenue': 'total_costed_revenue',
+        })
+    return {'daily': summaries.count(), 'hourly': hourly.count(), 'product': product_sales.count()}
+
+
+def sales_totals(start=None, end=None, cashier=None):
+    """Sale count, gross total and amount paid over a range of days."""
+    summaries = DailySalesSummary.objects.filter(**_day_filter(start, end))
+    if cashier is not None:
+        summaries = summaries.filter(cashier=cashier)
+    totals = summaries.aggregate(
+        count=Sum('sales_count'), gross=Sum('gross_total'), paid=Sum('amount_paid'),
+    )
+    return {
+        'count': totals['count'] or 0,
+        'gross': totals['gross'] or Decimal('0.00'),
+        'paid': totals['paid'] or Decimal('0.00'),
+    }
+
+
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+
+def sales_heatmap(start=None, end=None, cashier=None, payment_method=None):
+    """Sale count and total by weekday and local hour over a range of days.
+
+    Returns seven rows, Monday first, of 24 ``{'count', 'gross'}`` cells,
+    from one query grouped by weekday and hour over the hourly rollup.
+    """
+    buckets = HourlySalesSummary.objects.filter(**_day_filter(start, end))
+    if cashier is not None:
+        buckets = buckets.filter(cashier=cashier)
+    if payment_method:
+        buckets = buckets.filter(payment_method=payment_method)
+    grid = [[{'count': 0, 'gross': ZERO} for _ in range(24)] for _ in WEEKDAYS]
+    rows = (
+        buckets.annotate(weekday=ExtractIsoWeekDay('day'))
+        .values_list('weekday', 'hour')
+        .annotate(count=Sum('sales_count'), gross=Sum('gross_total'))
+        .order_by()
+    )
+    for weekday, hour, count, gross in rows:
+        grid[weekday - 1][hour] = {'count': count, 'gross': gross}
+    return grid
+
+
+TOTALS = ('total_quantity', 'total_revenue', 'total_cost', 'total_costed_revenue')
+
+
+def product_totals(start=None, end=None):
+    """Quantity, revenue and cost per product over a range of days.
+
+    One query grouped by product id alone; names and categories come from
+    the catalog, so the rollup never has to be joined to ``product``.
+    """
+    snapshot = get_catalog()
+    rows = (
+        ProductDailySales.objects.filter(**_day_filter(start, end))
+        .values('product_id')
+        .annotate(
+            total_quantity=Sum('quantity'),
+            total_revenue=Sum('revenue'),
+            total_cost=Sum('cost'),
+            total_costed_revenue=Sum('costed_revenue'),
+        )
+        .order_by()
+    )
+    products = []
+    for row in rows:
+        product = snapshot.by_id.get(row['product_id'])
+        products.append({
+            **row,
+            'product__name': product.name if product else f"Product #{row['product_id']}",
+            'product__category__name': product.category_name if product else 'Unknown',
+        })
+    return products
+
+
+def top_products(products, limit=5):
+    """Best sellers by quantity among ``product_totals`` rows."""
+    return heapq.nlargest(limit, products, key=itemgetter('total_quantity'))
+
+
+def category_sales(products):
+    """Quantity, revenue and gross margin per category from ``product_totals`` rows.
+
+    Margins only cover items whose cost price was known; ``cost_coverage``
+    is the share of revenue they account for.
+    """
+    categories = {}
+    for row in products:
+        totals = categories.setdefault(row['product__category__name'], dict.fromkeys(TOTALS, 0))
+        for field in TOTALS:
+            totals[field] += row[field] or 0
+    rows = [
+        _with_margin({'product__category__name': name, **totals})
+        for name, totals in categories.items()
+    ]
+    return sorted(rows, key=itemgetter('total_quantity'), reverse=True)
+
+
+def _with_margin(row):
+    costed = row['total_costed_revenue'] or ZERO
+    margin = costed - (row['total_cost'] or ZERO)
+    return {
+        **row,
+        'gross_margin': margin,
+        'margin_percent': (margin / costed * 100).quantize(Decimal('0.1')) if costed else None,
+        'cost_coverage': round(costed / row['total_revenue'] * 100) if row['total_revenue'] else None,
+    }
+
+
+def margin_totals(categories):
+    """Overall gross margin from the ``category_sales`` rows."""
+    return _with_margin({
+        field: sum(row[field] or 0 for row in categories)
+        for field in TOTALS
+    })
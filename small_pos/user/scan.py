@@ -0,0 +1,52 @@
+"""Barcode / SKU scan lookups.
+
+A scan resolves an exact SKU through the catalog cache's SKU hash map and
+only falls back to the database (through the partial unique index on
+``Product.sku``) when the cache has not seen the SKU yet.
+"""
+from django.db.models import Count
+
+from user.catalog import get_catalog
+from user.models import Product
+
+
+def duplicate_skus(model=Product):
+    """``{sku: [product ids]}`` for every non-blank SKU used more than once."""
+    repeated = (
+        model.objects.exclude(sku='')
+        .values('sku').annotate(uses=Count('id')).filter(uses__gt=1)
+        .values_list('sku', flat=True)
+    )
+    duplicates = {}
+    for sku, product_id in (model.objects.filter(sku__in=repeated)
+                            .order_by('sku', 'id').values_list('sku', 'id')):
+        duplicates.setdefault(sku, []).append(product_id)
+    return duplicates
+
+
+def lookup_sku(sku):
+    """Resolve ``sku`` to a catalog entry or ``Product``, or ``None``."""
+    sku = sku.strip()
+    if not sku:
+        return None
+    product = get_catalog().by_sku.get(sku)
+    if product is None:
+        # Blank SKUs are excluded so the partial unique index can be used
+        product = (
+            Product.objects.exclude(sku='').filter(sku=sku)
+            .select_related('category').first()
+        )
+    return product
+
+
+def scan_payload(product):
+    """Cart-ready payload, matching the items the POS page puts in its cart."""
+    return {
+        'id': product.id,
+        'name': product.name,
+        'sku': product.sku,
+        'price': str(product.price),
+        'stock': product.stock,
+        'stock_level': product.stock_level,
+        'quantity': 1,
+    }
@@ -0,0 +1,136 @@
+"""Full-text product search backed by an SQLite FTS5 index.
+
+``product_fts`` indexes each product's name, description, SKU and category
+name under the product's id. Triggers on ``product`` and ``category`` keep
+it in sync, including bulk inserts and queryset updates. Every word typed
+is matched as a prefix, so results narrow as the user types, and matches
+are ranked with BM25, weighting name and SKU hits above description hits.
+
+On databases other than SQLite the search falls back to ``icontains``.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from user.models import Product
+
+# BM25 weights for name, description, sku and category_name
+RANK = 'bm25(product_fts, 10.0, 1.0, 8.0, 3.0)'
+
+SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+        name, description, sku, category_name,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_insert AFTER INSERT ON product BEGIN
+        INSERT INTO product_fts (rowid, name, description, sku, category_name)
+        VALUES (new.id, new.name, new.description, new.sku,
+                (SELECT name FROM category WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_update
+    AFTER UPDATE OF name, description, sku, category_id ON product BEGIN
+        DELETE FROM product_fts WHERE rowid = old.id;
+        INSERT INTO product_fts (rowid, name, description, sku, category_name)
+        VALUES (new.id, new.name, new.description, new.sku,
+                (SELECT name FROM category WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_delete AFTER DELETE ON product BEGIN
+        DELETE FROM product_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_category_update
+    AFTER UPDATE OF name ON category BEGIN
+        UPDATE product_fts SET category_name = new.name
+        WHERE rowid IN (SELECT id FROM product WHERE category_id = new.id);
+    END
+    """,
+]
+
+DROP = [
+    'DROP TRIGGER IF EXISTS product_fts_insert',
+    'DROP TRIGGER IF EXISTS product_fts_update',
+    'DROP TRIGGER IF EXISTS product_fts_delete',
+    'DROP TRIGGER IF EXISTS product_fts_category_update',
+    'DROP TABLE IF EXISTS product_fts',
+]
+
+POPULATE = """
+    INSERT INTO product_fts (rowid, name, description, sku, category_name)
+    SELECT product.id, product.name, product.description, product.sku, category.name
+    FROM product JOIN category ON category.id = product.category_id
+"""
+
+
+def is_available(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def install(cursor):
+    """Create the index and its triggers, then fill it from scratch."""
+    for statement in DROP + SCHEMA:
+        cursor.execute(statement)
+    cursor.execute(POPULATE)
+    cursor.execute("INSERT INTO product_fts (product_fts) VALUES ('optimize')")
+
+
+def uninstall(cursor):
+    for statement in DROP:
+        cursor.execute(statement)
+
+
+def match_expression(text):
+    """Turn what the user typed into an FTS5 query matching every word as a prefix."""
+    words = re.findall(r'\w+', text.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _icontains(text):
+    return (
+        Q(name__icontains=text) |
+        Q(description__icontains=text) |
+        Q(sku__icontains=text) |
+        Q(category__name__icontains=text)
+    )
+
+
+def search_products(queryset, text):
+    """Filter a ``Product`` queryset down to matches for ``text``.
+
+    Matches carry a ``search_rank`` (lower is better) to order by.
+    """
+    match = match_expression(text)
+    if not match or not is_available():
+        # Nothing to rank by, every match ties
+        return queryset.filter(_icontains(text)).annotate(search_rank=Value(0.0, output_field=FloatField()))
+    return queryset.filter(
+        id__in=RawSQL('SELECT rowid FROM product_fts WHERE product_fts MATCH %s', [match]),
+    ).annotate(search_rank=RawSQL(
+        f'SELECT {RANK} FROM product_fts WHERE product_fts MATCH %s AND product_fts.rowid = product.id',
+        [match],
+        output_field=FloatField(),
+    ))
+
+
+def search_product_ids(text, limit=20):
+    """Ids of the best matches for ``text``, best first, straight from the index."""
+    match = match_expression(text)
+    if not match or not is_available():
+        return list(Product.objects.filter(_icontains(text)).order_by('name')
+                    .values_list('id', flat=True)[:limit])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM product_fts WHERE product_fts MATCH %s ORDER BY {RANK} LIMIT %s',
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,26 @@
+"""SQLite database backend for the shop (``ENGINE = 'user.sqlite'``), see ``base``."""
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+@contextmanager
+def immediate(using=None):
+    """``transaction.atomic()`` that takes SQLite's write lock at ``BEGIN IMMEDIATE``.
+
+    A transaction that reads before it writes cannot wait for the lock: if
+    another till commits in between, its first write fails straight away
+    with "database is locked", whatever the busy timeout. One that begins
+    IMMEDIATE waits its turn (up to the busy timeout) before reading.
+    Inside another ``atomic`` block the outer transaction has already
+    begun and this is a plain savepoint.
+    Other backends ignore the mode.
+    """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    if not connection.in_atomic_block:
+        connection.next_transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic(using=using):
+            yield
+    finally:
+        connection.next_transaction_mode = None
@@ -0,0 +1,50 @@
+"""Django's SQLite backend with per-connection pragmas and a choice of BEGIN.
+
+Settings ``OPTIONS`` take two extra keys, on top of what ``sqlite3.connect``
+accepts:
+
+``pragmas``
+    ``{name: value}`` run as ``PRAGMA name = value`` on every new
+    connection, e.g. ``journal_mode`` WAL so reports no longer block the
+    tills, and ``busy_timeout`` so a till waits for the write lock instead
+    of failing with "database is locked".
+``transaction_mode``
+    ``DEFERRED`` (SQLite's default), ``IMMEDIATE`` or ``EXCLUSIVE``, used
+    to ``BEGIN`` every transaction. ``user.sqlite.immediate`` picks
+    ``IMMEDIATE`` for one transaction instead.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Checked and set from the settings when connecting
+        self.transaction_mode = 'DEFERRED'
+        # Mode of the next outermost transaction only, set by ``immediate``
+        self.next_transaction_mode = None
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        mode = params.pop('transaction_mode', None) or 'DEFERRED'
+        if not isinstance(mode, str) or mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(f'Invalid SQLite transaction mode {mode!r}.')
+        self.transaction_mode = mode.upper()
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            if not name.isidentifier():
+                raise ImproperlyConfigured(f'Invalid SQLite pragma {name!r}.')
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.next_transaction_mode or self.transaction_mode
+        self.next_transaction_mode = None
+        self.cursor().execute(f'BEGIN {mode}')
@@ -0,0 +1,52 @@
+import threading
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TransactionTestCase
+
+from user.checkout import checkout_cart
+from user.management.commands._bench import seed_catalog
+from user.models import Product, SaleItem, Sales
+
+THREADS = 16
+
+
+class IdempotentCheckoutTests(TransactionTestCase):
+    """The same idempotency key submitted from many tills at once records one sale."""
+
+    def setUp(self):
+        cache.clear()
+        self.cashier, self.product_ids = seed_catalog(3, stock=1000)
+
+    def submit_together(self, cart, key):
+        barrier = threading.Barrier(THREADS)
+        results, errors = [], []
+
+        def submit():
+            try:
+                barrier.wait()
+                result = checkout_cart(cart, cashier=self.cashier, idempotency_key=key)
+                results.append((result.sale.sales_id, result.created))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_one_sale_per_key(self):
+        cart = [{'id': pk, 'quantity': 2} for pk in self.product_ids]
+        results, errors = self.submit_together(cart, 'till-1-sale-1')
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), THREADS)
+        self.assertEqual(len({sale_id for sale_id, _ in results}), 1)
+        self.assertEqual(sum(created for _, created in results), 1)
+        self.assertEqual(Sales.objects.count(), 1)
+        self.assertEqual(SaleItem.objects.count(), len(self.product_ids))
+        self.assertEqual(set(Product.objects.values_list('stock', flat=True)), {998})
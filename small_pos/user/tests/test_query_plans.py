@@ -0,0 +1,118 @@
+"""The hot queries must walk an index, never a whole table.
+
+A few thousand sales and activity entries are seeded and every query each
+page or helper runs is checked with ``EXPLAIN QUERY PLAN``.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from user.catalog import get_catalog
+from user.checkout import checkout_cart
+from user.dashboard import dashboard_stats, recent_receipts
+from user.management.commands._bench import seed_activity, seed_catalog, seed_sales
+from user.models import ActivityLog, Receipt, Sales
+from user.pagination import encode_cursor
+from user.reports import build_report
+from user.rollups import day_bounds
+from user.search import search_product_ids
+
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+# Reading a table this small whole is as cheap as an index lookup, and
+# SQLite's planner rightly prefers it (e.g. the handful of staff accounts)
+SMALL_TABLE = 1000
+
+
+def row_count(table):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+        return cursor.fetchone()[0]
+
+
+def full_scans(sql):
+    """Tables the plan of ``sql`` reads row by row without an index, and the plan."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        plan = [row[-1] for row in cursor.fetchall()]
+    # "SCAN t USING [COVERING] INDEX ..." walks an index; a bare "SCAN t" reads the table
+    tables = {
+        step.split()[1] for step in plan
+        if step.startswith('SCAN ') and ' USING ' not in step
+        and 'VIRTUAL TABLE' not in step and 'CONSTANT ROW' not in step
+    }
+    return [table for table in tables if row_count(table) >= SMALL_TABLE], plan
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cashier, cls.product_ids = seed_catalog(2000)
+        seed_sales(20_000, 365, cls.product_ids[0], len(cls.product_ids), cls.cashier.pk)
+        seed_activity(20_000, 365, cls.cashier.pk)
+
+    def setUp(self):
+        self.client.force_login(self.cashier)
+        get_catalog()  # loaded whole and cached by design, not a hot query
+
+    def assertNoFullScans(self, run, allowed=()):
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith(EXPLAINABLE):
+                continue
+            tables, plan = full_scans(sql)
+            bad = [table for table in tables if table not in allowed]
+            self.assertFalse(bad, f'Full scan of {", ".join(bad)}:\n{sql}\n' + '\n'.join(plan))
+
+    def cursor(self, model, time_field):
+        """Cursor of a page deep into the history."""
+        row = model.objects.order_by(time_field)[model.objects.count() // 2]
+        return encode_cursor(getattr(row, time_field), row.pk)
+
+    def test_dashboard(self):
+        def run():
+            cache.clear()
+            dashboard_stats()
+            dashboard_stats(self.cashier)
+            list(recent_receipts())
+            list(recent_receipts(self.cashier))
+        # The all-time sale count adds up every row of the daily rollup
+        self.assertNoFullScans(run, allowed=('daily_sales_summary',))
+
+    def test_reports(self):
+        today = timezone.localdate()
+        self.assertNoFullScans(lambda: build_report(today - timedelta(days=29), today))
+
+    def test_transactions(self):
+        after = self.cursor(Receipt, 'issued_at')
+        self.assertNoFullScans(lambda: self.client.get(f'/transactions/?after={after}'))
+
+    def test_activity_log(self):
+        after = self.cursor(ActivityLog, 'timestamp')
+        month_ago = (timezone.localdate() - timedelta(days=29)).isoformat()
+        for query in (f'after={after}', 'action=sale', f'user={self.cashier.pk}', f'date_from={month_ago}'):
+            with self.subTest(query=query):
+                self.assertNoFullScans(lambda: self.client.get(f'/activity-log/?view_all=true&{query}'))
+
+    def test_cashier_sales(self):
+        today = timezone.localdate()
+        self.assertNoFullScans(lambda: list(
+            Sales.objects.filter(cashier=self.cashier, sale_date__gte=day_bounds(today, today)[0])
+            .order_by('-sale_date')[:20]
+        ))
+
+    def test_search(self):
+        self.assertNoFullScans(lambda: search_product_ids('Product 0012'))
+
+    def test_inventory_by_level(self):
+        # The inventory cards value the whole stock
+        self.assertNoFullScans(lambda: self.client.get('/inventory/?level=low-stock'), allowed=('product',))
+
+    def test_checkout(self):
+        cart = [{'id': pk, 'quantity': 1} for pk in self.product_ids[:3]]
+        self.assertNoFullScans(lambda: checkout_cart(cart, cashier=self.cashier))
@@ -17,8 +17,17 @@ urlpatterns = [
    path('sales/new/', views.sales_view, name='new_sale'),  # Display products page
     path('sales/checkout/', views.sales, name='checkout'),  # Process checkout
     path('sales/receipt/<int:sale_id>/', views.checkout, name='checkout'),  # Show receipt
+    path('api/sales/', views.api_sales, name='api_sales'),  # JSON checkout for terminals
+    path('api/sales/batch/', views.api_sales_batch, name='api_sales_batch'),  # Offline sales upload
+    path('api/products/search/', views.search_products_api, name='search_products_api'),
+    path('api/scan/', views.scan_product, name='scan_product'),  # Barcode scanner lookups
+    path('api/catalog/stats/', views.catalog_stats, name='catalog_stats'),
+    path('api/dashboard/stats/', views.dashboard_stats_api, name='dashboard_stats_api'),  # Dashboard auto-refresh
     
     path('reports/', views.reports_view, name='reports'),
+    path('reports/heatmap/', views.sales_heatmap_view, name='sales_heatmap'),  # Sales by weekday and hour
+    path('reports/jobs/<str:key>/', views.report_job_status, name='report_job_status'),  # Polled while a report is prepared
+    path('reports/export/<str:dataset>/', views.export_data, name='export_data'),  # CSV downloads
     path('transactions/', views.transactions, name='transactions'),
     path('users/', views.user_list, name='users'),
     path('settings/', views.settings_view, name='settings'),
@@ -39,4 +48,5 @@ urlpatterns = [
 
     #LOGS
     path('activity-log/', views.activity_log, name='activity_log'),
+    path('history/<str:kind>/<int:pk>/', views.object_history, name='object_history'),  # Activity of one product, category, user or sale
 ]
\ No newline at end of file
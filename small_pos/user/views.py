@@ -1,13 +1,23 @@
-from datetime import datetime, timedelta, date
+from datetime import date
 from django.core.paginator import Paginator
 import json
+from itertools import islice
+from urllib.parse import urlencode
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.hashers import check_password
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
-from django.http import JsonResponse
-from user.models import User, Category, Product, Sales, SaleItem, Receipt, ActivityLog
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError
+from django.db.models import Q, Sum, Count, F, DecimalField, Prefetch
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from decimal import Decimal
+from user.models import User, Category, Product, Sales, SaleItem, Receipt, ActivityLog, ReportJob
+from user import activity, archive, rollups
+from user.dashboard import dashboard_stats, recent_receipts, stats_payload
+from user.exports import EXPORTS
+from user.pagination import cached_count, paginate
+from user.reports import submit_report, wait_for
 
 
 # Create your views here.
@@ -76,6 +86,8 @@ def signup(request):
                 position=position
             )
             user.save()
+            activity.log(request, 'user_register', f'Registered user "{user.username}" ({position or "no position"})',
+                         obj=user, user=user)
 
             messages.success(request, "Account created successfully! Please log in.")
             return redirect("login")
@@ -102,6 +114,7 @@ def login_view(request):
 
         # Log the user in base on role
         login(request, user)
+        activity.log(request, 'user_login', f'User "{user.username}" logged in', obj=user)
 
         messages.success(request, f"Welcome back, {user.first_name}!")
         if user.position == 'worker':
@@ -119,38 +132,23 @@ def forgot_password_view(request):
         pass
     return render(request, 'forgot_password.html')
 
+def stats_cashier(request, own=False):
+    """Whose sales the dashboard figures cover: the user's own on their dashboard and for cashiers, else everyone's"""
+    return request.user if own or request.user.position == 'worker' else None
+
+
 @login_required
 def dashboard_view(request):
     #account info
     user=request.user
-    products_list = Product.objects.count()
-    total_categories = Category.objects.count()
-    low_stock_count = Product.objects.filter(stock_level='Low Stock').count()
-    today_sales = Sales.objects.filter(sale_date__date=date.today())
-    receipt = Receipt.objects.select_related('sale').prefetch_related('sale__items__product').order_by('-issued_at')[:3]
-    receipts = Receipt.objects.select_related('sale').order_by('-issued_at')[:3]
-    receipt_count = Receipt.objects.count()
-
-    
-    #give me the total sales amount for today
-    today = date.today()
-    today_sales = Sales.objects.filter(sale_date__date=today)
-    total_sales_amount = sum(sale.total_amount for sale in today_sales)
-
-
-    
+    cashier = stats_cashier(request)
+    stats = dashboard_stats(cashier=cashier)
 
     context={
-        'total_products':products_list,
-        'total_categories':total_categories,
-        'low_stock_count': low_stock_count,
-        'total_sales_amount': total_sales_amount,
-        'today_sales_count': today_sales.count(),
+        **stats,
         'user':user,
-        'Receipt_count': receipt_count,
-        'receipt': receipt,
-        'receipts': receipts,
-
+        'Receipt_count': stats['transaction_count'],
+        'receipt': recent_receipts(cashier=cashier),
     }
     return render(request, 'dashboard.html',context)
 
@@ -159,55 +157,45 @@ def dashboard_view(request):
 def user_dashboard(request):
     #account info
     user=request.user
-    products_list = Product.objects.count()
-    total_categories = Category.objects.count()
-    low_stock_count = Product.objects.filter(stock_level='Low Stock').count()
-    today_sales = Sales.objects.filter(sale_date__date=date.today())
-    receipt = Receipt.objects.filter(sale__cashier=user).select_related('sale').prefetch_related('sale__items__product').order_by('-issued_at')[:3]
-    receipts = Receipt.objects.filter(sale__cashier=user).select_related('sale').order_by('-issued_at')[:5]
-    receipt_count = Receipt.objects.filter(sale__cashier=user).count()
-
-    
-    #give me the total sales amount for today by only user
-    today = date.today()
-    today_sales = Sales.objects.filter(sale_date__date=today, cashier=user)
-    total_sales_amount = sum(sale.total_amount for sale in today_sales)
-    
+    #today's figures cover only this user's sales
+    cashier = stats_cashier(request, own=True)
+    stats = dashboard_stats(cashier=cashier)
 
     context={
-        'total_products':products_list,
-        'total_categories':total_categories,
-        'low_stock_count': low_stock_count,
-        'total_sales_amount': total_sales_amount,
-        'today_sales_count': today_sales.count(),
+        **stats,
         'user':user,
-        'Receipt_count': receipt_count,
-        'receipt': receipt,
-        'receipts': receipts,
-
+        'Receipt_count': stats['transaction_count'],
+        'receipt': recent_receipts(cashier=cashier),
     }
     return render(request, 'user_dashboard.html',context)
 
+
+@login_required
+def dashboard_stats_api(request):
+    """Card figures for the dashboard's auto-refresh, scoped the same way as the page (?own=1 from the user dashboard)"""
+    cashier = stats_cashier(request, own=request.GET.get('own') == '1')
+    return JsonResponse(stats_payload(dashboard_stats(cashier=cashier)))
+
 @login_required
 def transactions(request):
     """View to display all transactions/sales"""
     # Get all receipts ordered by most recent first
-    receipts = Receipt.objects.select_related('sale').prefetch_related(
-        'sale__items__product'
-    ).order_by('-issued_at')
+    receipts = Receipt.objects.select_related('sale__cashier').prefetch_related(
+        Prefetch('sale__items', queryset=SaleItem.objects.select_related('product'))
+    )
     
-    # Add pagination (15 items per page)
-    paginator = Paginator(receipts, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # 15 per page, each page picking up where the last one stopped
+    page_obj = paginate(receipts, 'issued_at', request.GET.get('after'), request.GET.get('before'), size=15)
     
     # Calculate total sales amount for current page
-    total_amount = sum(receipt.sale.total_amount for receipt in page_obj)
+    total_amount = Receipt.objects.filter(pk__in=[receipt.pk for receipt in page_obj]).aggregate(
+        total=Sum('sale__total_amount')
+    )['total'] or Decimal('0.00')
     
     context = {
         'page_obj': page_obj,
         'receipts': page_obj,
-        'total_transactions': receipts.count(),
+        'total_transactions': cached_count(Receipt.objects.all()),
         'total_amount': total_amount,
     }
     
@@ -220,82 +208,67 @@ from django.db.models import Q
 from .models import Sales, Product
 from django.http import JsonResponse
 
-def sales_view(request):
-    """Display sales page with product search"""
-    search_query = request.GET.get('search', '')
-    
-    # Fetch all products for the POS interface
-    if search_query:
-        products = Product.objects.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query)
-        ).order_by('name')
-    else:
-        products = Product.objects.all().order_by('name')
-    
-    context = {
-        'products': products,
-        'search_query': search_query,
-    }
-    return render(request, 'sales.html', context)
-
-
 def search_products_api(request):
     """API endpoint for real-time product search"""
     search_query = request.GET.get('q', '')
+    snapshot = get_catalog()
     
     if search_query:
-        products = Product.objects.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query)
-        ).values('id', 'name', 'price', 'stock')[:10]  # Limit to 10 results
+        # Ranked ids from the full-text index, details from the catalog cache
+        ids = search_product_ids(search_query, limit=10)  # Limit to 10 results
+        products = [snapshot.by_id[i] for i in ids if i in snapshot.by_id]
     else:
-        products = Product.objects.all().values('id', 'name', 'price', 'stock')[:20]
+        products = snapshot.products[:20]
     
     return JsonResponse({
-        'products': list(products)
+        'products': [
+            {'id': p.id, 'name': p.name, 'price': p.price, 'stock': p.stock}
+            for p in products
+        ]
     })
+INVENTORY_PAGE_SIZE = 48
+STOCK_LEVEL_FILTERS = {
+    'in-stock': 'In Stock',
+    'low-stock': 'Low Stock',
+    'out-of-stock': 'Out of Stock',
+}
+
+
 def inventory_view(request):
     """Display all products in inventory"""
     search_query = request.GET.get('search', '')
-    products_list = Product.objects.all().order_by('name')
-    total_categories = Category.objects.count()
-    
-    # Update stock levels for all products before displaying
-    for product in products_list:
-        if product.stock == 0:
-            product.stock_level = 'Out of Stock'
-        elif product.stock < product.min_stock:
-            product.stock_level = 'Low Stock'
-        else:
-            product.stock_level = 'In Stock'
-        product.save()
+    level_filter = request.GET.get('level', '')
     
-    # Calculate total value
-    total_value = sum(product.price * product.stock for product in products_list)
+    # Valuation and counts in a single aggregate query
+    summary = Product.objects.aggregate(
+        total_products=Count('id'),
+        total_value=Sum(F('price') * F('stock'), output_field=DecimalField(max_digits=14, decimal_places=2)),
+        low_stock_count=Count('id', filter=Q(stock_level='Low Stock')),
+    )
 
-    # Low stock products count
-    low_stock_count = Product.objects.filter(stock_level='Low Stock').count()    
+    # Only the columns the cards show, with the category joined in
+    products_list = Product.objects.select_related('category').only(
+        'id', 'name', 'price', 'stock', 'min_stock', 'stock_level', 'category__name',
+    ).order_by('name', 'id')
 
     # Search functionality
     if search_query:
-        products_list = products_list.filter(
-            Q(name__icontains=search_query) | 
-            Q(description__icontains=search_query) |
-            Q(category__name__icontains=search_query)
-        )
-    
-    # Get category names for each product
-    for product in products_list:
-        product.category_name = product.category.name if product.category else 'No Category'
+        products_list = search_products(products_list, search_query).order_by('search_rank', 'id')
+    if level_filter in STOCK_LEVEL_FILTERS:
+        products_list = products_list.filter(stock_level=STOCK_LEVEL_FILTERS[level_filter])
+
+    paginator = Paginator(products_list, INVENTORY_PAGE_SIZE)
+    page_obj = paginator.get_page(request.GET.get('page'))
     
     context = {
-        'products': products_list,
+        'products': page_obj,
+        'page_obj': page_obj,
         'search_query': search_query,
-        'total_products': Product.objects.count(),
-        'total_categories': total_categories,
-        'total_value': total_value,
-        'low_stock_count': low_stock_count,
+        'level_filter': level_filter,
+        'total_products': summary['total_products'],
+        'total_categories': len(get_catalog().categories),
+        'total_value': (summary['total_value'] or Decimal('0')).quantize(Decimal('0.01')),
+        'low_stock_count': summary['low_stock_count'],
         
     }
     
@@ -316,22 +289,15 @@ def restock_product(request, product_id):
             old_stock = product.stock
             product.stock += additional_stock
             
-            # Update stock level
-            if product.stock == 0:
-                product.stock_level = 'Out of Stock'
-            elif product.stock < product.min_stock:
-                product.stock_level = 'Low Stock'
-            else:
-                product.stock_level = 'In Stock'
-            
+            # Saving also updates the stock level
             product.save()
             
             # Log the activity
-            ActivityLog.objects.create(
-                user=request.user,
-                action='stock_update',
-                description=f'Restocked product "{product.name}". Old Stock: {old_stock}, New Stock: {product.stock}, Added: {additional_stock}',
-                related_object=f'Product ID: {product.id}'
+            activity.log(
+                request,
+                'stock_update',
+                f'Restocked product "{product.name}". Old Stock: {old_stock}, New Stock: {product.stock}, Added: {additional_stock}',
+                obj=product
             )
             
             messages.success(request, f'Product "{product.name}" restocked successfully!')
@@ -350,112 +316,149 @@ def restock_product(request, product_id):
 
 from django.shortcuts import render
 from django.db.models import Sum, Count, F
-from django.db.models.functions import TruncMonth
 
 from decimal import Decimal
 from .models import Sales, SaleItem, Product, Category
 
+@login_required
 def reports_view(request):
     # Get date filters from request
     from_date = request.GET.get('from_date')
     to_date = request.GET.get('to_date')
+    try:
+        start = date.fromisoformat(from_date) if from_date else None
+        end = date.fromisoformat(to_date) if to_date else None
+    except ValueError:
+        # Ignore a malformed range rather than failing the whole report
+        from_date = to_date = start = end = None
     
-    # Base queryset
-    sales_qs = Sales.objects.all()
-    
-    # Apply date filters if provided
-    if from_date:
-        sales_qs = sales_qs.filter(sale_date__gte=from_date)
-    if to_date:
-        # Include the entire end date
-        to_date_obj = datetime.strptime(to_date, '%Y-%m-%d')
-        to_date_end = to_date_obj + timedelta(days=1)
-        sales_qs = sales_qs.filter(sale_date__lt=to_date_end)
-    
-    # Summary Statistics
-    total_sales = sales_qs.aggregate(
-        total=Sum('total_amount')
-    )['total'] or Decimal('0.00')
-    
-    total_transactions = sales_qs.count()
-    
-    # Top Selling Products (based on quantity sold)
-    top_products = SaleItem.objects.filter(
-        sale__in=sales_qs
-    ).values(
-        'product__name'
-    ).annotate(
-        total_quantity=Sum('quantity'),
-        total_revenue=Sum(F('quantity') * F('unit_price'))
-    ).order_by('-total_quantity')[:5]
-    
-    # Get top product name
-    top_product_name = top_products[0]['product__name'] if top_products else 'N/A'
-    
-    # Category Breakdown
-    category_data = SaleItem.objects.filter(
-        sale__in=sales_qs
-    ).values(
-        'product__category__name'
-    ).annotate(
-        total_quantity=Sum('quantity')
-    ).order_by('-total_quantity')
-    
-    category_labels = [item['product__category__name'] for item in category_data]
-    category_values = [item['total_quantity'] for item in category_data]
-    
-    # Monthly Sales (last 6 months)
-    six_months_ago = datetime.now() - timedelta(days=180)
-    monthly_sales = Sales.objects.filter(
-        sale_date__gte=six_months_ago
-    ).annotate(
-        month=TruncMonth('sale_date')
-    ).values('month').annotate(
-        total=Sum('total_amount')
-    ).order_by('month')
-    
-    # Prepare monthly data for chart
-    month_labels = []
-    month_values = []
-    for item in monthly_sales:
-        month_labels.append(item['month'].strftime('%b'))
-        month_values.append(float(item['total']))
-    
-    # Recent Transactions - Filter sales that have receipts
-    recent_sales_with_receipts = Sales.objects.filter(
-        receipt__isnull=False,
-        sale_date__in=sales_qs.values_list('sale_date', flat=True) if from_date or to_date else Sales.objects.all().values_list('sale_date', flat=True)
-    ).select_related('receipt').prefetch_related('items').order_by('-sale_date')[:10]
-
-    receipt_count = Receipt.objects.count()
-    
-    # Prepare transaction data
-    transactions_data = []
-    for sale in recent_sales_with_receipts:
-        transactions_data.append({
-            'receipt_no': sale.receipt.receipt_number,
-            'date': sale.sale_date.strftime('%Y-%m-%d'),
-            'items_count': sale.items.count(),
-            'total': sale.total_amount,
-            'staff': 'N/A'  # Add staff field to Sales model if needed
-        })
+    # Computed in the background and shared by everyone asking for the same range
+    job = submit_report(start, end, user=request.user if request.user.is_authenticated else None)
+    job = wait_for(job)
     
     context = {
-        'total_sales': total_sales,
-        'total_transactions': total_transactions,
-        'top_product_name': top_product_name,
-        'top_products': top_products,
-        'category_labels': category_labels,
-        'category_values': category_values,
-        'month_labels': month_labels,
-        'month_values': month_values,
-        'transactions': transactions_data,
+        'report_job': job,
+        'category_labels': [],
+        'category_values': [],
+        'month_labels': [],
+        'month_values': [],
         'from_date': from_date or '',
         'to_date': to_date or '',
-        'receipt_count': receipt_count,
     }
+    if job.status == 'done':
+        context.update(job.result)
+        context['receipt_count'] = job.result['total_transactions']
     
     return render(request, 'report.html', context)
+
+
+@login_required
+def report_job_status(request, key):
+    """Polled by the reports page while its report is being prepared"""
+    job = get_object_or_404(ReportJob, key=key)
+    return JsonResponse({'status': job.status, 'error': job.error})
+
+
+@login_required
+def export_data(request, dataset):
+    """Stream sales, sale items or receipts as CSV; cashiers only export their own sales"""
+    export = EXPORTS.get(dataset)
+    if export is None:
+        raise Http404('Unknown export.')
+    from_date = request.GET.get('from_date', '')
+    to_date = request.GET.get('to_date', '')
+    cashier = request.GET.get('cashier', '')
+    try:
+        start = date.fromisoformat(from_date) if from_date else None
+        end = date.fromisoformat(to_date) if to_date else None
+    except ValueError:
+        return HttpResponseBadRequest('Dates must be given as YYYY-MM-DD.')
+    if cashier and not cashier.isdigit():
+        return HttpResponseBadRequest('Cashier must be a user id.')
+    if request.user.position == 'worker':
+        cashier = request.user.pk
+
+    response = StreamingHttpResponse(
+        export.stream(start, end, cashier or None), content_type='text/csv; charset=utf-8',
+    )
+    filename = '_'.join(filter(None, [dataset, from_date, to_date])) + '.csv'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+def sales_heatmap_view(request):
+    """Sales by weekday and hour of day, for planning till staffing"""
+    from_date = request.GET.get('from_date', '')
+    to_date = request.GET.get('to_date', '')
+    cashier = request.GET.get('cashier', '')
+    payment_method = request.GET.get('payment_method', '')
+    metric = 'gross' if request.GET.get('metric') == 'gross' else 'count'
+    try:
+        start = date.fromisoformat(from_date) if from_date else None
+        end = date.fromisoformat(to_date) if to_date else None
+    except ValueError:
+        from_date = to_date = ''
+        start = end = None
+    if not cashier.isdigit():
+        cashier = ''
+    if payment_method not in dict(Sales.PAYMENT_CHOICES):
+        payment_method = ''
+    if request.user.position == 'worker':
+        cashier = str(request.user.pk)
+
+    grid = rollups.sales_heatmap(start, end, cashier or None, payment_method)
+    peak = max(cell[metric] for row in grid for cell in row)
+    for row in grid:
+        for cell in row:
+            # Opacity from 0 to 1, relative to the busiest hour
+            cell['shade'] = float(cell[metric] / peak) if peak else 0.0
+
+    return render(request, 'heatmap.html', {
+        'rows': zip(rollups.WEEKDAYS, grid),
+        'hours': range(24),
+        'hour_totals': [sum(row[hour]['count'] for row in grid) for hour in range(24)],
+        'metric': metric,
+        'cashiers': User.objects.order_by('username') if request.user.position != 'worker' else [],
+        'payment_methods': Sales.PAYMENT_CHOICES,
+        'from_date': from_date,
+        'to_date': to_date,
+        'cashier': cashier,
+        'payment_method': payment_method,
+    })
+
+# Objects whose activity history can be looked up, by URL name
+HISTORY_MODELS = {'products': Product, 'categories': Category, 'users': User, 'sales': Sales}
+
+
+@login_required
+def object_history(request, kind, pk):
+    """Activity log entries about one product, category, user or sale, newest first, 50 at a time"""
+    model = HISTORY_MODELS.get(kind)
+    if model is None:
+        raise Http404('Unknown object type.')
+    entries = ActivityLog.objects.filter(
+        content_type=ContentType.objects.get_for_model(model), object_id=pk,
+    ).select_related('user')
+    page = paginate(entries, 'timestamp', request.GET.get('after'), request.GET.get('before'), size=50)
+    return JsonResponse({
+        'object': {'type': kind, 'id': pk},
+        'entries': [
+            {
+                'id': entry.id,
+                'timestamp': entry.timestamp.isoformat(),
+                'action': entry.action,
+                'action_display': entry.get_action_display(),
+                'description': entry.description,
+                'user': entry.user.username if entry.user else None,
+                'ip_address': entry.ip_address,
+            }
+            for entry in page
+        ],
+        'next': page.next_cursor or None,
+        'previous': page.previous_cursor or None,
+    })
+
 def user_list(request):
     users = User.objects.all()
 
@@ -467,107 +470,80 @@ import json
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from .models import Product, Sales, SaleItem, Receipt
+from django.views.decorators.http import require_POST
+from . import catalog
+from .catalog import get_catalog
+from .search import search_products, search_product_ids
+from .scan import lookup_sku, scan_payload
+from .checkout import (
+    checkout_cart, checkout_batch, issue_sale_token, read_sale_token, receipt_payload,
+    CheckoutError, InsufficientStock, MAX_BATCH_SIZE,
+)
 
 
 def sales_view(request):
     """Display the new sale page with all products"""
-    products = Product.objects.all().order_by('name')
+    search_query = request.GET.get('search', '')
+    snapshot = get_catalog()
     
-    # Create a new sale object to get the ID for the form action
-    sale = Sales.objects.create(total_amount=0.00)
+    if search_query:
+        products = [snapshot.by_id[i] for i in search_product_ids(search_query, limit=200) if i in snapshot.by_id]
+    else:
+        products = snapshot.products
     
+    # Reserve the sale with a signed token; the row is only created at checkout
     context = {
         'products': products,
-        'sale': sale,
+        'search_query': search_query,
+        'sale_token': issue_sale_token(),
     }
     return render(request, 'sales.html', context)
 
 
+def log_sale(request, sale):
+    activity.log(
+        request, 'sale',
+        f'Sale #{sale.sales_id} of GH₵{sale.total_amount} paid by {sale.get_payment_method_display()}',
+        obj=sale,
+    )
+
+
 def sales(request):
     """Process cart checkout and create sale record"""
     if request.method == 'POST':
         try:
             cart_data = json.loads(request.POST.get('cart_data', '[]'))
-            print("Cart Data:", cart_data)
-            
+
             if not cart_data:
                 messages.error(request, 'Cart is empty!')
                 return redirect('new_sale')
-            
-            # Calculate total amount
-            total_amount = sum(float(item['price']) * int(item['quantity']) for item in cart_data)
-            payment_method = request.POST.get('payment_method', 'cash')
-            amount_paid = request.POST.get('amount_paid')
-            receipt_method = request.POST.get('receipt_method', 'none')
-            
-            # Convert amount_paid to float if provided
-            if amount_paid:
-                try:
-                    amount_paid = float(amount_paid)
-                except (ValueError, TypeError):
-                    amount_paid = None
-            
-            # Get the sale_id from the form (created when page loaded)
-            sale_id = request.POST.get('sale_id')
-            if sale_id:
-                # Update existing sale
-                sale = Sales.objects.get(sales_id=sale_id)
-                sale.total_amount = total_amount
-                sale.payment_method = payment_method
-                sale.amount_paid = amount_paid
-                sale.receipt_method = receipt_method
-                sale.cashier = request.user
-                sale.save()
+
+            # Resubmitting the same sale page returns the original sale
+            idempotency_key = request.POST.get('idempotency_key') or request.headers.get('Idempotency-Key')
+            sale_token = request.POST.get('sale_token')
+            if sale_token:
+                idempotency_key = read_sale_token(sale_token)
+
+            # The whole cart is committed in one transaction
+            result = checkout_cart(
+                cart_data,
+                cashier=request.user,
+                payment_method=request.POST.get('payment_method', 'cash'),
+                amount_paid=request.POST.get('amount_paid'),
+                receipt_method=request.POST.get('receipt_method', 'none'),
+                idempotency_key=idempotency_key,
+            )
+            sale = result.sale
+
+            if result.created:
+                log_sale(request, sale)
+                messages.success(request, f'Sale #{sale.sales_id} completed successfully!')
             else:
-                # Create new sale
-                sale = Sales.objects.create(
-                    total_amount=total_amount,
-                    payment_method=payment_method,
-                    amount_paid=amount_paid,
-                    receipt_method=receipt_method,
-                    cashier=request.user
-                )
-            
-            # Process each item in cart
-            for item in cart_data:
-                product = Product.objects.get(id=item['id'])
-                quantity_ordered = int(item['quantity'])
-                
-                if product.stock >= quantity_ordered:
-                    # Deduct from stock
-                    product.stock -= quantity_ordered
-                    
-                    # Update stock level
-                    if product.stock == 0:
-                        product.stock_level = 'Out of Stock'
-                    elif product.stock < product.min_stock:
-                        product.stock_level = 'Low Stock'
-                    else:
-                        product.stock_level = 'In Stock'
-                    
-                    product.save()
-                    
-                    # Create SaleItem record with unit_price field
-                    SaleItem.objects.create(
-                        sale=sale,
-                        product=product,
-                        quantity=quantity_ordered,
-                        unit_price=float(item['price'])
-                    )
-                else:
-                    # Insufficient stock - delete the sale and show error
-                    sale.delete()
-                    messages.error(request, f'Insufficient stock for {product.name}. Available: {product.stock}, Requested: {quantity_ordered}')
-                    return redirect('new_sale')
-            
-            # Create receipt
-            Receipt.objects.get_or_create(sale=sale)
-            
-            messages.success(request, f'Sale #{sale.sales_id} completed successfully!')
+                messages.info(request, f'Sale #{sale.sales_id} was already completed.')
             return redirect('checkout', sale_id=sale.sales_id)
-            
-        except Product.DoesNotExist:
-            messages.error(request, 'One or more products not found!')
+
+        except CheckoutError as e:
+            messages.error(request, str(e))
             return redirect('new_sale')
         except Exception as e:
             messages.error(request, f'Error processing sale: {str(e)}')
@@ -576,6 +552,87 @@ def sales(request):
     return redirect('new_sale')
 
 
+@require_POST
+def api_sales(request):
+    """JSON checkout: takes the cart as a JSON body and returns the receipt in one round trip"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Request body must be valid JSON.'}, status=400)
+    if not isinstance(payload, dict) or not isinstance(payload.get('items'), list):
+        return JsonResponse({'error': 'Expected an object with an "items" list.'}, status=400)
+
+    try:
+        result = checkout_cart(
+            payload['items'],
+            cashier=request.user,
+            payment_method=payload.get('payment_method', 'cash'),
+            amount_paid=payload.get('amount_paid'),
+            receipt_method=payload.get('receipt_method', 'none'),
+            idempotency_key=payload.get('idempotency_key') or request.headers.get('Idempotency-Key'),
+        )
+    except InsufficientStock as e:
+        return JsonResponse({
+            'error': str(e),
+            'product_id': e.product.id,
+            'available': e.product.stock,
+            'requested': e.requested,
+        }, status=409)
+    except CheckoutError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    if result.created:
+        log_sale(request, result.sale)
+    return JsonResponse(receipt_payload(result), status=201 if result.created else 200)
+
+
+@require_POST
+def api_sales_batch(request):
+    """Upload a batch of sales captured while the terminal was offline"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Request body must be valid JSON.'}, status=400)
+    if not isinstance(payload, dict) or not isinstance(payload.get('sales'), list):
+        return JsonResponse({'error': 'Expected an object with a "sales" list.'}, status=400)
+    if len(payload['sales']) > MAX_BATCH_SIZE:
+        return JsonResponse({'error': f'A batch can hold at most {MAX_BATCH_SIZE} sales.'}, status=400)
+
+    try:
+        results = checkout_batch(payload['sales'], cashier=request.user)
+    except CheckoutError as e:
+        # Nothing from this batch was written; the terminal should retry it
+        return JsonResponse({'error': str(e)}, status=409)
+
+    summary = {'created': 0, 'duplicate': 0, 'conflict': 0, 'invalid': 0}
+    for result in results:
+        summary[result['status']] += 1
+        if result['status'] == 'created':
+            activity.log(request, 'sale', f"Sale #{result['sale_id']} uploaded from an offline terminal",
+                         obj=(Sales, result['sale_id']))
+    return JsonResponse({'summary': summary, 'results': results})
+
+
+def scan_product(request):
+    """Resolve a scanned barcode/SKU to a cart-ready product"""
+    product = lookup_sku(request.GET.get('sku', ''))
+    if product is None:
+        return JsonResponse({'error': 'No product with this SKU.'}, status=404)
+    return JsonResponse({'product': scan_payload(product)})
+
+
+@login_required
+def catalog_stats(request):
+    """Hit/miss counters of this process's catalog cache"""
+    return JsonResponse(catalog.stats())
+
+
 def checkout(request, sale_id=None):
     """Display receipt for completed sale"""
     if sale_id:
@@ -609,6 +666,9 @@ def checkout(request, sale_id=None):
     return render(request, 'checkout.html', context)
 
 def logout_view(request):
+    if request.user.is_authenticated:
+        activity.log(request, 'user_logout', f'User "{request.user.username}" logged out',
+                     obj=request.user)
     logout(request)
     messages.success(request, "You have been logged out.")
     return redirect("login")
@@ -659,19 +719,19 @@ def add_product(request):
         cost_price = request.POST.get('cost_price', None)
         stock = request.POST.get('stock')
         min_stock = request.POST.get('min_stock', 10)
-        sku = request.POST.get('sku', '')
+        sku = request.POST.get('sku', '').strip()
         
         # Validation
         if not name or not category_id or not price or not stock:
             messages.error(request, 'Please fill in all required fields.')
-            categories = Category.objects.all()
+            categories = get_catalog().categories
             return render(request, 'add_product.html', {'categories': categories})
         
         try:
             # Check if SKU already exists
             if sku and Product.objects.filter(sku=sku).exists():
                 messages.error(request, 'A product with this SKU already exists.')
-                categories = Category.objects.all()
+                categories = get_catalog().categories
                 return render(request, 'add_product.html', {'categories': categories})
             
             # Create product
@@ -686,17 +746,24 @@ def add_product(request):
                 min_stock=min_stock,
                 sku=sku,
             )
+            activity.log(
+                request, 'product_add',
+                f'Added product "{product.name}" in {category.name}. Price: GH₵{price}, Stock: {stock}',
+                obj=product
+            )
             
             messages.success(request, f'Product "{product.name}" added successfully!')
             return redirect('inventory')
             
         except Category.DoesNotExist:
             messages.error(request, 'Selected category does not exist.')
+        except IntegrityError:
+            messages.error(request, 'A product with this SKU already exists.')
         except Exception as e:
             messages.error(request, f'Error creating product: {str(e)}')
 
     
-    categories = Category.objects.all()
+    categories = get_catalog().categories
     context = {
         'categories': categories,
     }
@@ -717,12 +784,12 @@ def edit_product(request, product_id):
         cost_price = request.POST.get('cost_price', None)
         stock = request.POST.get('stock')
         min_stock = request.POST.get('min_stock', 10)
-        sku = request.POST.get('sku', '')
+        sku = request.POST.get('sku', '').strip()
         
         # Validation
         if not name or not category_id or not price or not stock:
             messages.error(request, 'Please fill in all required fields.')
-            categories = Category.objects.all()
+            categories = get_catalog().categories
             return render(request, 'edit_product.html', {
                 'product': product,
                 'categories': categories
@@ -730,9 +797,9 @@ def edit_product(request, product_id):
         
         try:
             # Check if SKU already exists for other products
-            if sku and Product.objects.filter(sku=sku).exclude(id=product_id).exists():
+            if sku and Product.objects.filter(sku=sku).exclude(id=product.id).exists():
                 messages.error(request, 'A product with this SKU already exists.')
-                categories = Category.objects.all()
+                categories = get_catalog().categories
                 return render(request, 'edit_product.html', {
                     'product': product,
                     'categories': categories
@@ -776,11 +843,11 @@ def edit_product(request, product_id):
                 changes.append(f"SKU: {old_values['sku']} → {sku}")
             
             # Log the activity
-            ActivityLog.objects.create(
-                user=request.user,
-                action='product_update',
-                description=f'Edited product "{product.name}". Changes: {", ".join(changes) if changes else "No changes"}',
-                related_object=f'Product ID: {product.id}'
+            activity.log(
+                request,
+                'product_update',
+                f'Edited product "{product.name}". Changes: {", ".join(changes) if changes else "No changes"}',
+                obj=product
             )
             
             messages.success(request, f'Product "{product.name}" updated successfully!')
@@ -788,10 +855,12 @@ def edit_product(request, product_id):
             
         except Category.DoesNotExist:
             messages.error(request, 'Selected category does not exist.')
+        except IntegrityError:
+            messages.error(request, 'A product with this SKU already exists.')
         except Exception as e:
             messages.error(request, f'Error updating product: {str(e)}')
     
-    categories = Category.objects.all()
+    categories = get_catalog().categories
     context = {
         'product': product,
         'categories': categories,
@@ -807,6 +876,8 @@ def delete_product(request, product_id):
     if request.method == 'POST':
         product_name = product.name
         product.delete()
+        activity.log(request, 'product_delete', f'Deleted product "{product_name}"',
+                     obj=(Product, product_id))
         messages.success(request, f'Product "{product_name}" deleted successfully!')
         return redirect('inventory')
     
@@ -838,6 +909,8 @@ def add_category(request):
                 name=name,
                 description=description
             )
+            activity.log(request, 'category_add', f'Added category "{category.name}"',
+                         obj=category)
             
             messages.success(request, f'Category "{category.name}" added successfully!')
             return redirect('categories')
@@ -867,9 +940,15 @@ def edit_category(request, category_id):
         
         # Update category
         try:
+            old_name = category.name
             category.name = name
             category.description = description
             category.save()
+            activity.log(
+                request, 'category_update',
+                f'Edited category "{name}"' + (f'. Name: {old_name} → {name}' if old_name != name else ''),
+                obj=category
+            )
             messages.success(request, f'Category "{name}" updated successfully!')
             return redirect('category')
         except Exception as e:
@@ -902,6 +981,8 @@ def delete_category(request, category_id):
         try:
             category_name = category.name
             category.delete()
+            activity.log(request, 'category_delete', f'Deleted category "{category_name}"',
+                         obj=(Category, category_id))
             messages.success(request, f'Category "{category_name}" deleted successfully!')
         except Exception as e:
             messages.error(request, f'Error deleting category: {str(e)}')
@@ -926,11 +1007,7 @@ def view_category_products(request, category_id):
     # Optional: Add search functionality for products
     search_query = request.GET.get('search', '')
     if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) | 
-            Q(description__icontains=search_query) |
-            Q(sku__icontains=search_query)
-        )
+        products = search_products(products, search_query).order_by('search_rank', 'id')
     
     context = {
         'category': category,
@@ -951,6 +1028,8 @@ def activity_log(request):
     
     # Check if user wants to view all logs
     view_all = request.GET.get('view_all', 'false') == 'true'
+    # Entries past the retention window are only read from the archive on request
+    source = 'archive' if request.GET.get('source') == 'archive' else ''
     
     # Fetch activity logs ordered by most recent first
     all_activity_logs = ActivityLog.objects.all().order_by('-timestamp')
@@ -969,11 +1048,21 @@ def activity_log(request):
     if user_filter:
         all_activity_logs = all_activity_logs.filter(user__id=user_filter)
     
-    if date_from:
-        all_activity_logs = all_activity_logs.filter(timestamp__date__gte=date_from)
-    
-    if date_to:
-        all_activity_logs = all_activity_logs.filter(timestamp__date__lte=date_to)
+    # Compared as a range on the timestamp itself so the index is used;
+    # a date that does not parse is dropped on its own
+    start = end = None
+    try:
+        start = date.fromisoformat(date_from) if date_from else None
+    except ValueError:
+        date_from = ''
+    try:
+        end = date.fromisoformat(date_to) if date_to else None
+    except ValueError:
+        date_to = ''
+    if start:
+        all_activity_logs = all_activity_logs.filter(timestamp__gte=rollups.day_bounds(start, start)[0])
+    if end:
+        all_activity_logs = all_activity_logs.filter(timestamp__lt=rollups.day_bounds(end, end)[1])
     
     if search_query:
         all_activity_logs = all_activity_logs.filter(
@@ -982,17 +1071,24 @@ def activity_log(request):
             models.Q(related_object__icontains=search_query)
         )
     
+    if source == 'archive':
+        # Read lazily, a page at a time, over a bounded range of days
+        start, end = archive.search_range(start, end)
+        date_from, date_to = start.isoformat(), end.isoformat()
+        all_activity_logs = archive.search(start, end, action_filter, user_filter, search_query)
+    
     # Determine if showing all or recent 5
     if view_all:
-        # Show all with pagination (20 items per page)
-        paginator = Paginator(all_activity_logs, 20)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+        # Show all, 20 per page, each page picking up where the last one stopped
+        page_obj = paginate(
+            all_activity_logs.select_related('user') if source != 'archive' else all_activity_logs,
+            'timestamp', request.GET.get('after'), request.GET.get('before'), size=20,
+        )
         activity_logs = page_obj
         is_view_all = True
     else:
         # Show only recent 5
-        activity_logs = all_activity_logs[:5]
+        activity_logs = list(islice(all_activity_logs, 5)) if source == 'archive' else all_activity_logs.select_related('user')[:5]
         page_obj = None
         is_view_all = False
     
@@ -1002,21 +1098,13 @@ def activity_log(request):
     # Get all action types for filter dropdown
     action_choices = ActivityLog.ACTION_CHOICES
     
-    # Calculate stats
-    from django.utils import timezone
-    today = timezone.now().date()
-    week_ago = today - timedelta(days=7)
-    
-    stats = {
-        'total_activities': ActivityLog.objects.count(),
-        'today_activities': ActivityLog.objects.filter(timestamp__date=today).count(),
-        'this_week_activities': ActivityLog.objects.filter(timestamp__date__gte=week_ago).count(),
-    }
+    # Stats come from the daily counters kept up as entries are written
+    stats = activity.activity_stats()
     
     context = {
         'page_obj': page_obj if is_view_all else None,
         'activity_logs': activity_logs,
-        'total_activities': all_activity_logs.count(),
+        'total_activities': None if source == 'archive' else cached_count(all_activity_logs),
         'all_users': all_users,
         'action_choices': action_choices,
         'action_filter': action_filter,
@@ -1024,6 +1112,16 @@ def activity_log(request):
         'date_from': date_from,
         'date_to': date_to,
         'search_query': search_query,
+        'source': source,
+        # Carried over to the previous/next page links
+        'filter_query': urlencode({
+            key: value for key, value in [
+                ('view_all', 'true'), ('action', action_filter), ('user', user_filter),
+                ('date_from', date_from), ('date_to', date_to), ('search', search_query), ('source', source),
+            ] if value
+        }),
+        'archived_months': archive.months(),
+        'archive_search_days': archive.ARCHIVE_SEARCH_DAYS,
         'is_view_all': is_view_all,
         'stats': stats,
     }